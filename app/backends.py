@@ -0,0 +1,156 @@
+"""Backends de inferencia intercambiables: Keras, TFLite y ONNX Runtime.
+
+Todos reciben un lote float32 (N, 224, 224, 3) ya preprocesado y devuelven la
+probabilidad de la clase 1 por imagen. El backend se elige con
+``INFERENCE_BACKEND`` (``auto`` lo deduce de la extensión del archivo):
+
+    .h5 / .keras -> keras    .tflite -> tflite    .onnx -> onnx
+
+Las librerías de cada backend se importan solo al cargar el modelo.
+"""
+from __future__ import annotations
+import os
+import threading
+from typing import Dict, Type
+
+import numpy as np
+
+
+class InferenceBackend:
+    name = "base"
+
+    def __init__(self, path: str, threads: int = 0):
+        self.path = path
+        self.threads = threads
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class KerasBackend(InferenceBackend):
+    name = "keras"
+
+    def __init__(self, path: str, threads: int = 0):
+        super().__init__(path, threads)
+        if threads > 0:
+            os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(threads))
+            os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+            os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+        from keras.models import load_model as keras_load_model
+        self.model = keras_load_model(path)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model.predict_on_batch(batch))[:, 0]
+
+    def close(self):
+        self.model = None
+
+
+def _tflite_interpreter():
+    # LiteRT (ai-edge-litert) > tflite-runtime > TensorFlow completo
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+    return Interpreter
+
+
+class TFLiteBackend(InferenceBackend):
+    """Intérprete TFLite con XNNPACK (delegado por defecto en CPU).
+
+    El intérprete no es thread-safe y el tamaño del lote es fijo hasta que se
+    redimensiona la entrada, así que cada llamada toma un lock.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path: str, threads: int = 0):
+        super().__init__(path, threads)
+        Interpreter = _tflite_interpreter()
+        self.interpreter = Interpreter(model_path=path, num_threads=threads if threads > 0 else None)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self.input["shape"][0])
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size: int):
+        if batch_size != self._batch_size:
+            shape = [batch_size, *self.input["shape"][1:]]
+            self.interpreter.resize_tensor_input(self.input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self._resize(len(batch))
+            data = batch
+            scale, zero_point = self.input["quantization"]
+            if self.input["dtype"] != np.float32 and scale:
+                # Modelo con entrada entera (int8 completo): se cuantiza la entrada
+                info = np.iinfo(self.input["dtype"])
+                data = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+            self.interpreter.set_tensor(self.input["index"], np.asarray(data, dtype=self.input["dtype"]))
+            self.interpreter.invoke()
+            out = self.interpreter.get_tensor(self.output["index"])
+            scale, zero_point = self.output["quantization"]
+            if self.output["dtype"] != np.float32 and scale:
+                out = (out.astype(np.float32) - zero_point) * scale
+            return np.asarray(out, dtype=np.float32)[:, 0]
+
+    def close(self):
+        with self._lock:
+            self.interpreter = None
+
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, path: str, threads: int = 0):
+        super().__init__(path, threads)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # InferenceSession.run es thread-safe
+        out = self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+        return np.asarray(out, dtype=np.float32)[:, 0]
+
+    def close(self):
+        self.session = None
+
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+EXTENSIONS = {".tflite": "tflite", ".onnx": "onnx", ".h5": "keras", ".keras": "keras"}
+
+
+def backend_name_for(path: str, name: str = "auto") -> str:
+    if name != "auto":
+        return name
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), "keras")
+
+
+def create_backend(path: str, name: str = "auto", threads: int = 0) -> InferenceBackend:
+    name = backend_name_for(path, name)
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de inferencia desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+    return BACKENDS[name](path, threads)
@@ -9,14 +9,74 @@ def _env_list(name: str, default: str = ""):
         return []
     return [x.strip() for x in raw.split(",") if x.strip()]
 
+def _env_bool(name: str, default: str = "false"):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
 class Settings:
     PROJECT_NAME: str = os.getenv("PROJECT_NAME", "OVA DETECT")
 
     MODEL_NAME: str = os.getenv("MODEL_NAME", "")
     DATABASE_PATH: str = os.getenv("DATABASE_PATH", "app.db")
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negativo = KiB
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    MIGRATION_CHUNK_SIZE: int = int(os.getenv("MIGRATION_CHUNK_SIZE", "1000"))
+    COUNT_CACHE_TTL_SECONDS: float = float(os.getenv("COUNT_CACHE_TTL_SECONDS", "5"))
+    # Lecturas async: hilos lectores (una conexión cada uno); las escrituras van a un único hilo
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+    EXPORT_FETCH_SIZE: int = int(os.getenv("EXPORT_FETCH_SIZE", "500"))
     MAX_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "25"))
+    UPLOAD_CHUNK_SIZE_KB: int = int(os.getenv("UPLOAD_CHUNK_SIZE_KB", "1024"))
     SUPPORTED_FILE_TYPES: list[str] = _env_list("SUPPORTED_FILE_TYPES", "pdf")
 
+    # Derivados de cada imagen (miniatura y tensor preprocesado), generados en segundo plano
+    DERIVATIVES_FOLDER: str = os.getenv("DERIVATIVES_FOLDER", "derivatives")
+    DERIVATIVE_WORKERS: int = int(os.getenv("DERIVATIVE_WORKERS", "1"))
+    THUMBNAIL_SIZE: int = int(os.getenv("THUMBNAIL_SIZE", "256"))
+    THUMBNAIL_FORMAT: str = os.getenv("THUMBNAIL_FORMAT", "webp")  # webp | jpeg
+    THUMBNAIL_QUALITY: int = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+
+    # Inference config
+    INFERENCE_BATCH_SIZE: int = int(os.getenv("INFERENCE_BATCH_SIZE", "32"))
+    PREDICTION_CACHE_SIZE: int = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+    INFERENCE_MAX_WAIT_MS: float = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+    ANALYSIS_WORKERS: int = int(os.getenv("ANALYSIS_WORKERS", "2"))
+    # Un análisis / derivado reclamado por un worker que no lo terminó en este
+    # tiempo (proceso caído o reiniciado) lo retoma otro; también es el
+    # intervalo con el que cada worker busca trabajos abandonados
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+    CPU_POOL_SIZE: int = int(os.getenv("CPU_POOL_SIZE", str(max(1, (os.cpu_count() or 2) - 1))))
+
+    # Versión con la que se registra el modelo de MODEL_NAME al arrancar
+    MODEL_VERSION: str = os.getenv("MODEL_VERSION", "1.0")
+    # keras | tflite | onnx | auto (según la extensión de MODEL_NAME)
+    INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "auto")
+    # Hilos del backend en modo local (0 = valor por defecto de la librería)
+    INFERENCE_THREADS: int = int(os.getenv("INFERENCE_THREADS", "0"))
+    # Cada cuánto revisa cada proceso con modelo la tabla model_deployments
+    # (versión activa y en sombra compartida por todos los workers; 0 = nunca)
+    MODEL_SYNC_SECONDS: float = float(os.getenv("MODEL_SYNC_SECONDS", "2"))
+
+    # "local": el modelo se carga en cada worker HTTP
+    # "remote": se usa el servidor de inferencia (python -m app.inference_server)
+    INFERENCE_MODE: str = os.getenv("INFERENCE_MODE", "local")
+    INFERENCE_ADDRESS: str = os.getenv("INFERENCE_ADDRESS", "127.0.0.1:8765")
+    # Sin valor por defecto: obligatoria para el servidor de inferencia y el modo remote
+    INFERENCE_AUTHKEY: str = os.getenv("INFERENCE_AUTHKEY", "")
+    INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "2"))
+    INFERENCE_THREADS_PER_WORKER: int = int(os.getenv("INFERENCE_THREADS_PER_WORKER", "0"))
+    INFERENCE_PIN_CPUS: bool = _env_bool("INFERENCE_PIN_CPUS")
+    # Warm-up al iniciar: carga el modelo y corre un lote de prueba en segundo
+    # plano; /health/ready responde 503 hasta que termina
+    MODEL_WARMUP: bool = _env_bool("MODEL_WARMUP")
+
+    # Observabilidad: cabecera Server-Timing en cada respuesta y endpoints
+    # /debug/profiler (profiler por muestreo, se enciende en caliente)
+    SERVER_TIMING: bool = _env_bool("SERVER_TIMING", "true")
+    PROFILER_ENABLED: bool = _env_bool("PROFILER_ENABLED")
+
     # API config
     API_HOST: str = os.getenv("API_HOST", "127.0.0.1")
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
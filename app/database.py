@@ -1,170 +1,446 @@
 from __future__ import annotations
+import base64
+import itertools
+import json
 import math
 import sqlite3
-from typing import Any, Dict, List
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
 
+from app import metrics
 from app.config import settings
-from app.migrations import SCHEMA
+from app.migrations import FTS_TABLES, migrate
 from app.models import PagedResource
 
 LIKE_FIELDS = ['name', 'description']
+# Límite de parámetros por sentencia (SQLITE_MAX_VARIABLE_NUMBER)
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+# Con 3 o más caracteres la búsqueda por nombre usa FTS5 (trigram) en lugar de LIKE
+FTS_FIELD = 'name'
+FTS_MIN_LENGTH = 3
+
+_fts_tables: Dict[str, str] = {}
+# Columnas que nunca son NULL por tabla: el cursor puede usar la comparación de tuplas directa
+_not_null_columns: Dict[str, set] = {}
+
+_initialized: set[str] = set()
+_init_lock = threading.Lock()
+# Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)
+_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+# Conteos recientes por (base, tabla, filtros) para no repetir COUNT(*) en cada página
+_count_cache: Dict[tuple, tuple] = {}
+_count_cache_lock = threading.Lock()
+
+
+def _configure(conn: sqlite3.Connection):
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    conn.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
 
 
 def ensure_db(path: str | None = None):
+    # Las migraciones pendientes se aplican una sola vez por proceso y ruta,
+    # no en cada consulta
     db_path = path or settings.DATABASE_PATH
-    conn = sqlite3.connect(db_path)
+    if db_path in _initialized:
+        return
+    with _init_lock:
+        if db_path in _initialized:
+            return
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+            migrate(conn, settings.MIGRATION_CHUNK_SIZE)
+            _detect_fts(conn)
+            _detect_not_null(conn)
+        finally:
+            conn.close()
+        _initialized.add(db_path)
+
+def _detect_fts(conn: sqlite3.Connection):
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table_name, fts_table in FTS_TABLES.items():
+        if fts_table in existing:
+            _fts_tables[table_name] = fts_table
+
+def _detect_not_null(conn: sqlite3.Connection):
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for table_name in tables:
+        # table_xinfo: (cid, name, type, notnull, dflt_value, pk, hidden)
+        _not_null_columns[table_name] = {
+            row[1] for row in conn.execute(f"PRAGMA table_xinfo({table_name})") if row[3] or row[5]
+        }
+
+def get_connection() -> sqlite3.Connection:
+    db_path = settings.DATABASE_PATH
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != db_path:
+        ensure_db(db_path)
+        conn = sqlite3.connect(db_path)
+        _configure(conn)
+        _local.conn, _local.path = conn, db_path
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+def close_connections():
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Conexión creada en otro hilo; se libera al terminar ese hilo
+                pass
+        _connections.clear()
+    _local.__dict__.clear()
+
+def _fts_query(value: str) -> str:
+    return f'{FTS_FIELD} : "' + str(value).replace('"', '""') + '"'
+
+def _build_where(table_name: str, filters: Dict[str, str]):
+    params: list = []
+    like_fields = LIKE_FIELDS
+    fts_table = _fts_tables.get(table_name)
+    conditions = []
+    for col, value in (filters or {}).items():
+        if value is None:
+            conditions.append(f"{col} IS NULL")
+        elif col == FTS_FIELD and fts_table and len(str(value)) >= FTS_MIN_LENGTH:
+            conditions.append(f"id IN (SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?)")
+            params.append(_fts_query(value))
+        elif col in like_fields:
+            conditions.append(f"{col} LIKE ?")
+            params.append(f"%{value}%")
+        else:
+            conditions.append(f"{col} = ?")
+            params.append(value)
+    return conditions, params
+
+def encode_cursor(order_by: str, value: Any, id: int) -> str:
+    raw = json.dumps([order_by, value, id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, order_by: str):
     try:
-        conn.executescript(SCHEMA)
-        conn.commit()
-    finally:
-        conn.close()
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order_by, value, id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido.")
+    if cursor_order_by != order_by:
+        raise ValueError("El cursor no corresponde a este order_by.")
+    return value, id
+
+def _cached_count(conn, table_name: str, where: str, params: list) -> int:
+    key = (settings.DATABASE_PATH, table_name, where, tuple(params))
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+    with metrics.db_timer(table_name, "count"):
+        total = conn.execute(f"SELECT COUNT(*) FROM {table_name}{where}", params).fetchone()[0]
+    with _count_cache_lock:
+        _count_cache[key] = (now + settings.COUNT_CACHE_TTL_SECONDS, total)
+    return total
+
+def _invalidate_counts(table_name: str):
+    with _count_cache_lock:
+        for key in [k for k in _count_cache if k[1] == table_name]:
+            del _count_cache[key]
+
+def _keyset_condition(table_name: str, order_by: str, order_dir: str, value: Any, last_id: int):
+    op = "<" if order_dir == "DESC" else ">"
+    if order_by == "id":
+        return f"id {op} ?", [last_id]
+    if order_by in _not_null_columns.get(table_name, ()):
+        return f"({order_by}, id) {op} (?, ?)", [value, last_id]
+    # (col, id) > (NULL, ?) es NULL: con columnas que admiten NULL se separa
+    # en ramas explícitas. SQLite ordena los NULL primero en ASC y al final en DESC
+    if order_dir == "DESC":
+        if value is None:
+            return f"({order_by} IS NULL AND id < ?)", [last_id]
+        return f"(({order_by}, id) < (?, ?) OR {order_by} IS NULL)", [value, last_id]
+    if value is None:
+        return f"(({order_by} IS NULL AND id > ?) OR {order_by} IS NOT NULL)", [last_id]
+    return f"({order_by}, id) > (?, ?)", [value, last_id]
+
+def build_list_query(
+        table_name: str, fields: List[str], filters: Dict[str, str],
+        order_by = 'id', order_dir = "ASC", limit: int = 10,
+        page: int = 1, cursor: str | None = None):
+    order_dir = order_dir.upper()
+    if fields and "*" not in fields:
+        # El cursor se arma con (order_by, id): deben venir en la selección
+        fields = list(fields) + [col for col in (order_by, "id") if col not in fields]
+    select_fields = ", ".join(fields) if fields else "*"
+    conditions, params = _build_where(table_name, filters)
+
+    order_clause = f"{order_by} {order_dir}" if order_by == "id" else f"{order_by} {order_dir}, id {order_dir}"
+    offset = (page - 1) * limit if limit > 0 else 0
+    if cursor:
+        # Keyset: se continúa después de la última fila, sin OFFSET
+        value, last_id = decode_cursor(cursor, order_by)
+        condition, cursor_params = _keyset_condition(table_name, order_by, order_dir, value, last_id)
+        conditions.append(condition)
+        params.extend(cursor_params)
+        offset = 0
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    query = f"SELECT {select_fields} FROM {table_name}{where} ORDER BY {order_clause} LIMIT ? OFFSET ?"
+    return query, params + [limit, offset]
+
+def build_count_query(table_name: str, group_by: str, filters: Dict[str, str],
+                      range_field: str | None = None, since: Any = None, until: Any = None):
+    conditions, params = _build_where(table_name, filters)
+    if since is not None:
+        conditions.append(f"{range_field} >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append(f"{range_field} < ?")
+        params.append(until)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    query = f"SELECT {group_by} AS value, COUNT(*) AS count FROM {table_name}{where} GROUP BY {group_by}"
+    return query, params
+
+def count_by(table_name: str, group_by: str, filters: Dict[str, str],
+             range_field: str | None = None, since: Any = None, until: Any = None) -> Dict[Any, int]:
+    query, params = build_count_query(table_name, group_by, filters, range_field, since, until)
+    with metrics.db_timer(table_name, "count_by"):
+        return {row["value"]: row["count"] for row in get_connection().execute(query, params)}
+
+def fetch_all(query: str, params: list, table: str = "query") -> List[Dict[str, Any]]:
+    # ``table`` solo etiqueta la métrica de duración
+    with metrics.db_timer(table, "fetch_all"):
+        return [dict(row) for row in get_connection().execute(query, params)]
+
+def explain_query_plan(query: str, params: list) -> List[str]:
+    conn = get_connection()
+    return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
 
 def list_all(
         table_name: str, fields: List[str], filters : Dict[str, str], 
         order_by = 'updated_at', order_dir = "ASC", limit: int  = 10,
-        page: int = 1) -> PagedResource:
-    ensure_db()
-    conn = sqlite3.connect(settings.DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        select_fields = ", ".join(fields) if fields else "*"
-        base_query = f"FROM {table_name}"
-        params: list = []
-        like_fields = LIKE_FIELDS
-
-        if filters:
-            conditions = []
-            for col, value in filters.items():
-                if value is None:
-                    conditions.append(f"{col} IS NULL")
-                elif col in like_fields:
-                    conditions.append(f"{col} LIKE ?")
-                    params.append(f"%{value}%")
-                else:
-                    conditions.append(f"{col} = ?")
-                    params.append(value)
-            base_query += " WHERE " + " AND ".join(conditions)
-
-        count_query = f"SELECT COUNT(*) {base_query}"
-        total_results = conn.execute(count_query, params).fetchone()[0]
+        page: int = 1, cursor: str | None = None,
+        include_count: bool = True) -> PagedResource:
+    conn = get_connection()
+
+    total_results = total_pages = None
+    if include_count:
+        conditions, params = _build_where(table_name, filters)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        total_results = _cached_count(conn, table_name, where, params)
         total_pages = math.ceil(total_results / limit) if limit > 0 else 1
 
-        query = f"SELECT {select_fields} {base_query} ORDER BY {order_by} {order_dir.upper()} LIMIT ? OFFSET ?"
-        offset = (page - 1) * limit
-        params_with_pagination = params + [limit, offset]
-        
-        rows = list(conn.execute(query, params_with_pagination))
-
-        return PagedResource(
-            data=[dict(r) for r in rows],
-            total_results=total_results,
-            total_pages=total_pages
-        ) 
-    finally:
-        conn.close()
+    query, params = build_list_query(table_name, fields, filters, order_by, order_dir, limit, page, cursor)
+    with metrics.db_timer(table_name, "list"):
+        rows = [dict(r) for r in conn.execute(query, params)]
 
-def get_one(table_name: str, filters : Dict[str, str]) -> Dict[str, Any]:
+    next_cursor = None
+    if limit > 0 and len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(order_by, last[order_by], last["id"])
+
+    return PagedResource(
+        data=rows,
+        total_results=total_results,
+        total_pages=total_pages,
+        next_cursor=next_cursor
+    ) 
+
+def stream_query(query: str, params: list, batch_size: int = 500,
+                 table: str = "query") -> Iterator[Dict[str, Any]]:
+    """Itera el resultado de ``query`` de a ``batch_size`` filas (memoria constante).
+
+    Usa una conexión propia: StreamingResponse avanza el generador desde
+    distintos hilos y una lectura larga no debe ocupar la conexión del hilo.
+    Se mide cada fetchmany, no el tiempo que el consumidor tarda en enviar.
+    """
     ensure_db()
-    conn = sqlite3.connect(settings.DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    like_fields = LIKE_FIELDS
+    conn = sqlite3.connect(settings.DATABASE_PATH, check_same_thread=False)
     try:
-        query = f"SELECT * FROM {table_name}"
-        params: list = []
-
-        if filters:
-            conditions = []
-            for col, value in filters.items():
-                if value is None:
-                    conditions.append(f"{col} IS NULL")
-                elif col in like_fields:
-                    conditions.append(f"{col} LIKE ?")
-                    params.append(f"%{value}%")
-                else:
-                    conditions.append(f"{col} = ?")
-                    params.append(value)
-            query += " WHERE " + " AND ".join(conditions)
-
-        query += " LIMIT 1"
-        row = conn.execute(query, params).fetchone()
-        return dict(row) if row else None
+        _configure(conn)
+        with metrics.db_timer(table, "stream"):
+            cur = conn.execute(query, params)
+        while True:
+            with metrics.db_timer(table, "stream"):
+                rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
     finally:
         conn.close()
 
+def get_one(table_name: str, filters : Dict[str, str]) -> Dict[str, Any]:
+    conn = get_connection()
+    query = f"SELECT * FROM {table_name}"
+    conditions, params = _build_where(table_name, filters)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += " LIMIT 1"
+    with metrics.db_timer(table_name, "get"):
+        row = conn.execute(query, params).fetchone()
+    return dict(row) if row else None
+
+def _insert_rows(conn: sqlite3.Connection, table_name: str, data_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    created = []
+    # Filas consecutivas con las mismas columnas van en el mismo INSERT multi-fila
+    for columns, group in itertools.groupby(data_rows, key=lambda row: tuple(row.keys())):
+        group = list(group)
+        col_names = ", ".join(columns)
+        row_placeholders = "(" + ", ".join(["?"] * len(columns)) + ")"
+        rows_per_statement = max(1, SQLITE_MAX_VARIABLES // max(1, len(columns)))
+        for start in range(0, len(group), rows_per_statement):
+            chunk = group[start:start + rows_per_statement]
+            params = [row[col] for row in chunk for col in columns]
+            if HAS_RETURNING:
+                query = (
+                    f"INSERT INTO {table_name} ({col_names}) "
+                    f"VALUES {', '.join([row_placeholders] * len(chunk))} RETURNING *"
+                )
+                rows = [dict(r) for r in conn.execute(query, params).fetchall()]
+                # RETURNING no garantiza el orden: se ordena por id (orden de inserción)
+                if rows and "id" in rows[0]:
+                    rows.sort(key=lambda r: r["id"])
+                created.extend(rows)
+            else:
+                query = f"INSERT INTO {table_name} ({col_names}) VALUES {row_placeholders}"
+                for row in chunk:
+                    cur = conn.execute(query, tuple(row[col] for col in columns))
+                    created.append(dict(conn.execute(
+                        f"SELECT * FROM {table_name} WHERE rowid = ?", (cur.lastrowid,)
+                    ).fetchone()))
+    return created
+
+class UnitOfWork:
+    """Escrituras de varias tablas dentro de una misma transacción.
+
+    Expone create_many/update_one con la misma firma que el módulo, para que
+    los repositorios acepten ``tx=`` indistintamente.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.tables: set[str] = set()
+
+    def create_many(self, table_name: str, data_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not data_rows:
+            return []
+        self.tables.add(table_name)
+        with metrics.db_timer(table_name, "insert"):
+            return _insert_rows(self.conn, table_name, data_rows)
+
+    def update_one(self, table_name: str, id: int, new_values: Dict[str, Any]):
+        if not new_values:
+            return {}
+        self.tables.add(table_name)
+        with metrics.db_timer(table_name, "update"):
+            if _update_row(self.conn, table_name, id, new_values) == 0:
+                return {}
+            row = self.conn.execute(f"SELECT * FROM {table_name} WHERE id = ? LIMIT 1", (id,)).fetchone()
+        return dict(row) if row else {}
+
+@contextmanager
+def unit_of_work():
+    # Commit único al salir, rollback de todo si algo falla. Usa la conexión
+    # del hilo actual: no hacer await dentro del bloque.
+    conn = get_connection()
+    uow = UnitOfWork(conn)
+    with conn:
+        yield uow
+        # Commit explícito para medirlo aparte (with conn ya no tiene nada que confirmar)
+        with metrics.db_timer("transaction", "commit"):
+            conn.commit()
+    for table_name in uow.tables:
+        _invalidate_counts(table_name)
+
 def create_many(table_name: str, data_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     if not data_rows:
         return []
 
-    ensure_db()
-    conn = sqlite3.connect(settings.DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        columns = list(data_rows[0].keys())
-        placeholders = ", ".join(["?"] * len(columns))
-        col_names = ", ".join(columns)
+    conn = get_connection()
+    # Todo el lote en una transacción: si una fila falla se revierte todo y se
+    # propaga el error (sqlite3.IntegrityError, etc.)
+    with metrics.db_timer(table_name, "insert"), conn:
+        created = _insert_rows(conn, table_name, data_rows)
+    _invalidate_counts(table_name)
+    return created
 
-        inserted_ids = []
 
-        for row in data_rows:
-            values = tuple(row[col] for col in columns)
-            cur = conn.execute(
-                f"INSERT INTO {table_name} ({col_names}) VALUES ({placeholders})",
-                values
-            )
-            inserted_ids.append(cur.lastrowid)
+def upsert_many(table_name: str, data_rows: List[Dict[str, Any]], conflict_columns: List[str]) -> int:
+    if not data_rows:
+        return 0
 
-        conn.commit()
+    conn = get_connection()
+    columns = list(data_rows[0].keys())
+    placeholders = ", ".join(["?"] * len(columns))
+    col_names = ", ".join(columns)
+    updates = ", ".join(f"{col} = excluded.{col}" for col in columns if col not in conflict_columns)
+    query = (
+        f"INSERT INTO {table_name} ({col_names}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE SET {updates}"
+    )
+    with metrics.db_timer(table_name, "upsert"), conn:
+        cur = conn.executemany(query, [tuple(row[col] for col in columns) for row in data_rows])
+    _invalidate_counts(table_name)
+    return cur.rowcount
 
-        placeholders_ids = ", ".join(["?"] * len(inserted_ids))
-        select_query = f"SELECT * FROM {table_name} WHERE id IN ({placeholders_ids})"
-        rows = conn.execute(select_query, inserted_ids).fetchall()
 
-        return [dict(r) for r in rows]
-    except Exception as e:
-        # Error log removed for cleaner output
-        pass
-    finally:
-        conn.close()
+def _update_row(conn: sqlite3.Connection, table_name: str, id: int, new_values: Dict[str, Any]):
+    set_clause = ", ".join([f"{col} = ?" for col in new_values.keys()])
+    params = list(new_values.values())
 
+    if not id:
+        raise ValueError("Se requiere un id para actualizar.")
+    
+    update_query = f"UPDATE {table_name} SET {set_clause} WHERE id = ?"
+    params.append(id)
+    return conn.execute(update_query, params).rowcount
 
 def update_one(table_name: str, id: int, new_values: Dict[str, Any]):
     if not new_values:
         return {}  
 
-    ensure_db()
-    conn = sqlite3.connect(settings.DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        set_clause = ", ".join([f"{col} = ?" for col in new_values.keys()])
-        params = list(new_values.values())
-
-        if not id:
-            raise ValueError("Se requiere un id para actualizar.")
-        
-        update_query = f"UPDATE {table_name} SET {set_clause} WHERE id = ?"
-        params.append(id)
-        cur = conn.execute(update_query, params)
-        conn.commit()
-
-        if cur.rowcount == 0:
-            return {}  
-        select_query = f"SELECT * FROM {table_name} WHERE id = ? LIMIT 1"
+    conn = get_connection()
+    with metrics.db_timer(table_name, "update"), conn:
+        rowcount = _update_row(conn, table_name, id, new_values)
+    _invalidate_counts(table_name)
+
+    if rowcount == 0:
+        return {}  
+    select_query = f"SELECT * FROM {table_name} WHERE id = ? LIMIT 1"
+    with metrics.db_timer(table_name, "get"):
         row = conn.execute(select_query, (id,)).fetchone()
-        return dict(row) if row else {}
-    finally:
-        conn.close()
+    return dict(row) if row else {}
+
+def claim_one(table_name: str, id: int, new_values: Dict[str, Any], condition: str, params: list) -> bool:
+    # UPDATE condicionado en una sola sentencia: entre varios procesos solo uno
+    # ve rowcount 1 y se queda con la fila
+    set_clause = ", ".join(f"{col} = ?" for col in new_values)
+    query = f"UPDATE {table_name} SET {set_clause} WHERE id = ? AND ({condition})"
+    conn = get_connection()
+    with metrics.db_timer(table_name, "claim"), conn:
+        rowcount = conn.execute(query, [*new_values.values(), id, *params]).rowcount
+    _invalidate_counts(table_name)
+    return rowcount == 1
 
 def delete_many(table_name: str, ids: List[int]):
     if not ids:
         return 0
 
-    ensure_db()
-    conn = sqlite3.connect(settings.DATABASE_PATH)
-    try:
-        placeholders = ", ".join(["?"] * len(ids))
-        query = f"DELETE FROM {table_name} WHERE id IN ({placeholders})"
+    conn = get_connection()
+    placeholders = ", ".join(["?"] * len(ids))
+    query = f"DELETE FROM {table_name} WHERE id IN ({placeholders})"
+    with metrics.db_timer(table_name, "delete"), conn:
         cur = conn.execute(query, ids)
-        conn.commit()
-        return cur.rowcount
-    finally:
-        conn.close()
+    _invalidate_counts(table_name)
+    return cur.rowcount
@@ -0,0 +1,105 @@
+"""Derivados de las imágenes subidas: miniatura, dimensiones reales y tensor.
+
+Se generan fuera de la petición (cola de trabajos en app.routers.image_files)
+y se guardan por hash de contenido, así una misma imagen subida varias veces
+comparte sus derivados:
+
+    derivatives/thumbnails/<hash>_<lado>.webp
+    derivatives/tensors/<hash>.v<versión>.npy
+"""
+from __future__ import annotations
+import os
+import threading
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+from app import preprocessing
+from app.config import settings
+
+THUMBNAIL_FOLDER = os.path.join(settings.DERIVATIVES_FOLDER, "thumbnails")
+TENSOR_FOLDER = os.path.join(settings.DERIVATIVES_FOLDER, "tensors")
+# Subir si cambia app.preprocessing: los tensores guardados dejan de servir
+TENSOR_VERSION = 2
+
+THUMBNAIL_FORMATS = {
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+}
+
+
+def thumbnail_path(content_hash: str) -> str:
+    ext = THUMBNAIL_FORMATS[settings.THUMBNAIL_FORMAT][0]
+    return os.path.join(THUMBNAIL_FOLDER, f"{content_hash}_{settings.THUMBNAIL_SIZE}{ext}")
+
+
+def thumbnail_media_type(path: str) -> str:
+    for ext, media_type, _ in THUMBNAIL_FORMATS.values():
+        if path.endswith(ext):
+            return media_type
+    return "application/octet-stream"
+
+
+def tensor_path(content_hash: str) -> str:
+    return os.path.join(TENSOR_FOLDER, f"{content_hash}.v{TENSOR_VERSION}.npy")
+
+
+def _write_atomic(path: str, write):
+    # Se escribe a un temporal y se renombra: un lector nunca ve un archivo a medias
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _save_npy(path: str, array: np.ndarray):
+    # Con un archivo abierto np.save no agrega ".npy" al nombre temporal
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+def make_thumbnail(img: np.ndarray, size: int) -> np.ndarray:
+    height, width = img.shape[:2]
+    scale = size / max(height, width)
+    if scale >= 1:
+        return img
+    new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
+
+
+def build_derivatives(image_path: str, content_hash: str) -> Dict[str, Any]:
+    """Decodifica el original una sola vez y genera todos los derivados."""
+    img = preprocessing.decode_original(np.fromfile(image_path, dtype=np.uint8))
+    height, width = img.shape[:2]
+
+    thumb = thumbnail_path(content_hash)
+    if not os.path.exists(thumb):
+        ext, _, quality_flag = THUMBNAIL_FORMATS[settings.THUMBNAIL_FORMAT]
+        ok, encoded = cv2.imencode(ext, make_thumbnail(img, settings.THUMBNAIL_SIZE),
+                                   [quality_flag, settings.THUMBNAIL_QUALITY])
+        if not ok:
+            raise ValueError(f"No se pudo codificar la miniatura {ext}")
+        _write_atomic(thumb, encoded.tofile)
+
+    tensor = tensor_path(content_hash)
+    if not os.path.exists(tensor):
+        out = np.empty((preprocessing.IMG_SIZE, preprocessing.IMG_SIZE, 3), dtype=np.float32)
+        preprocessing.preprocess_into(preprocessing.resize_for_model(img), out)
+        _write_atomic(tensor, lambda p: _save_npy(p, out))
+
+    return {"width": width, "height": height, "thumbnail": thumb}
+
+
+def load_tensor(content_hash: str | None) -> np.ndarray | None:
+    """Tensor preprocesado guardado (memory-mapped), o None si aún no existe."""
+    if not content_hash:
+        return None
+    try:
+        return np.load(tensor_path(content_hash), mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        return None
@@ -0,0 +1,50 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+
+# Pool acotado para trabajo de CPU (decodificación, CLAHE, inferencia).
+# cv2 y TensorFlow liberan el GIL, así que los hilos sí corren en paralelo.
+cpu_pool = ThreadPoolExecutor(
+    max_workers=max(1, settings.CPU_POOL_SIZE),
+    thread_name_prefix="ovadetect-cpu",
+)
+
+# SQLite admite un solo escritor: las escrituras se serializan en un hilo
+# dedicado y las lecturas (WAL) se reparten en un pool propio. Cada hilo usa
+# su conexión de database.get_connection().
+db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ovadetect-db-writer")
+db_readers = ThreadPoolExecutor(
+    max_workers=max(1, settings.DB_READ_POOL_SIZE),
+    thread_name_prefix="ovadetect-db-reader",
+)
+
+
+def _in_context(fn, args, kwargs):
+    # run_in_executor no copia el contexto (asyncio.to_thread sí): sin esto las
+    # mediciones de app.metrics hechas en el pool no llegan a Server-Timing
+    return functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool, _in_context(fn, args, kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    # E/S de disco en el executor por defecto, sin ocupar hilos del pool de CPU
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+async def run_db_read(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_readers, _in_context(fn, args, kwargs))
+
+
+async def run_db_write(fn, *args, **kwargs):
+    # Para transacciones de varias sentencias se pasa la función completa
+    # (p.ej. la que abre unit_of_work), que corre entera en el hilo escritor
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_writer, _in_context(fn, args, kwargs))
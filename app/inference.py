@@ -0,0 +1,259 @@
+from __future__ import annotations
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.medical import MedicalModelConfig
+from app.model_registry import ModelRegistry
+from app.repository import model_deployments
+
+logger = logging.getLogger(__name__)
+
+AI_FOLDER = "ai"
+MODEL_PATH = os.path.join(AI_FOLDER, settings.MODEL_NAME)
+
+# El modelo se carga en el primer uso (o en el warm-up), nunca al importar.
+# Otras versiones se cargan y activan en caliente: app.routers.models escribe
+# la tabla model_deployments y cada proceso con modelo la sigue (sync_models)
+registry = ModelRegistry(MedicalModelConfig.CLINICAL_THRESHOLD)
+_model_lock = threading.Lock()
+_state = {"loaded": False, "warmed": False, "load_seconds": None, "warmup_seconds": None, "error": None}
+_sync_lock = threading.Lock()
+# attempted: versión -> updated_at de la fila con la que se intentó cargar
+# (una carga fallida no se reintenta hasta que la fila cambie)
+_sync = {"threads": 0, "started": False, "attempted": {}}
+# Cargas de otras versiones: una a la vez y fuera del pool de CPU
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ovadetect-model-load")
+
+
+def parse_address(address: str):
+    # "host:puerto" -> socket TCP, cualquier otra cosa -> socket unix
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def desired_models() -> List[Dict[str, Any]]:
+    try:
+        return model_deployments.list_model_deployments()
+    except sqlite3.OperationalError:
+        # Base sin la migración de model_deployments (p.ej. el servidor de
+        # inferencia arrancó antes que la API): solo el modelo por defecto
+        return []
+
+
+def desired_active(rows: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    # Si dos peticiones activaron a la vez, gana la más reciente (filas ordenadas por updated_at)
+    active = [row for row in rows if row["state"] == "active"]
+    return active[-1] if active else None
+
+
+def load_model(threads: int = 0) -> ModelRegistry:
+    # Registra y activa la versión activa de model_deployments (o MODEL_NAME
+    # como MODEL_VERSION si no hay ninguna) si aún no hay un modelo activo
+    if registry.has_active():
+        return registry
+    with _model_lock:
+        if not registry.has_active():
+            threads = threads or settings.INFERENCE_THREADS
+            active = desired_active(desired_models())
+            if active is None:
+                version, path, backend = settings.MODEL_VERSION, MODEL_PATH, settings.INFERENCE_BACKEND
+            else:
+                version, path, backend = active["version"], active["path"], active["backend"]
+                _sync["attempted"][version] = active["updated_at"]
+            try:
+                # TensorFlow / ONNX Runtime solo se importan en el proceso que ejecuta el modelo
+                entry = registry.load(version, path, backend, threads, warmup=False)
+            except Exception as e:
+                _state["error"] = repr(e)
+                raise
+            registry.activate(entry.version)
+            _state.update(loaded=True, error=None, load_seconds=entry.load_seconds)
+            _sync["threads"] = threads
+            _start_sync()
+    return registry
+
+
+def _start_sync():
+    if _sync["started"] or settings.MODEL_SYNC_SECONDS <= 0:
+        return
+    _sync["started"] = True
+    threading.Thread(target=_sync_loop, name="ovadetect-model-sync", daemon=True).start()
+
+
+def _sync_loop():
+    while True:
+        time.sleep(settings.MODEL_SYNC_SECONDS)
+        try:
+            sync_models()
+        except Exception:
+            logger.exception("Model sync failed")
+
+
+def _load_version(row: Dict[str, Any]):
+    try:
+        registry.load(row["version"], row["path"], row["backend"], _sync["threads"])
+    except Exception:
+        logger.exception("Loading model %s failed", row["version"])
+        return
+    # Activar o poner en sombra apenas termina la carga, sin esperar al próximo ciclo
+    sync_models()
+
+
+def sync_models():
+    """Alinea el registro de este proceso con la tabla model_deployments.
+
+    La corren cada worker de uvicorn (modo local) y cada worker del servidor
+    de inferencia (modo remote). Las versiones que no están en la tabla no se
+    tocan; la carga de una versión nueva no bloquea: se sigue con la activa
+    hasta que esté lista.
+    """
+    # El primer modelo lo carga load_model: así no compiten por la misma versión
+    if not registry.has_active():
+        return
+    rows = desired_models()
+    with _sync_lock:
+        for row in rows:
+            version, state = row["version"], registry.state(row["version"])
+            if row["state"] != "retired" and state in (None, "unloaded", "failed"):
+                if _sync["attempted"].get(version) != row["updated_at"]:
+                    _sync["attempted"][version] = row["updated_at"]
+                    _loader.submit(_load_version, row)
+        active = desired_active(rows)
+        if active is not None and registry.state(active["version"]) == "ready":
+            # La versión anterior termina sus lotes en curso y se descarga sola
+            registry.activate(active["version"])
+        for row in rows:
+            if row["state"] == "retired" and registry.state(row["version"]) == "ready":
+                registry.unload(row["version"])
+        shadows = [row for row in rows if row["state"] == "standby" and row["shadow_fraction"] > 0]
+        current = registry.shadow
+        if shadows:
+            version, fraction = shadows[-1]["version"], shadows[-1]["shadow_fraction"]
+            if current != (version, fraction) and registry.state(version) == "ready":
+                registry.set_shadow(version, fraction)
+        elif current[0] is not None and current[0] in {row["version"] for row in rows}:
+            registry.set_shadow(None)
+
+
+def predict_local(batch: np.ndarray) -> Tuple[str, np.ndarray]:
+    return load_model().predict(batch)
+
+
+def active_version() -> str | None:
+    # Versión que sirve este proceso: clave del caché de predicciones. None
+    # mientras no se sabe (modelo sin cargar o servidor que aún no respondió):
+    # MODEL_VERSION podría no ser la activa en model_deployments
+    if settings.INFERENCE_MODE == "remote":
+        return _client.last_version if _client is not None else None
+    return registry.active_version
+
+
+class RemoteInferenceClient:
+    """Cliente del servidor de inferencia (``python -m app.inference_server``).
+
+    Mantiene un pool de conexiones reutilizables; cada llamada bloquea el hilo
+    que la hace, así que debe invocarse desde el pool de CPU.
+    """
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._idle: queue.SimpleQueue = queue.SimpleQueue()
+        self.last_version: str | None = None
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return Client(self.address, authkey=self.authkey)
+
+    def _call(self, op: str, payload=None):
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                conn.send((op, payload))
+                status, result = conn.recv()
+            except (EOFError, OSError):
+                # El servidor cerró la conexión (p.ej. reinicio): se reintenta una vez
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            self._idle.put(conn)
+            if status != "ok":
+                raise RuntimeError(f"Inference server error: {result}")
+            return result
+
+    def predict(self, batch: np.ndarray) -> Tuple[str, np.ndarray]:
+        version, probs = self._call("predict", np.ascontiguousarray(batch, dtype=np.float32))
+        self.last_version = version
+        return version, np.asarray(probs)
+
+    def ping(self):
+        return self._call("ping")
+
+    def models(self):
+        # Registro de uno de los workers del servidor (todos siguen model_deployments)
+        return self._call("models")
+
+
+_client: RemoteInferenceClient | None = None
+
+
+def authkey() -> bytes:
+    # multiprocessing.connection deserializa con pickle: con una clave conocida
+    # cualquiera que alcance el socket podría ejecutar código en el servidor
+    if not settings.INFERENCE_AUTHKEY:
+        raise RuntimeError("INFERENCE_AUTHKEY no está configurada: es obligatoria para el servidor de inferencia")
+    return settings.INFERENCE_AUTHKEY.encode()
+
+
+def get_client() -> RemoteInferenceClient:
+    global _client
+    if _client is None:
+        _client = RemoteInferenceClient(settings.INFERENCE_ADDRESS, authkey())
+    return _client
+
+
+def predict(batch: np.ndarray) -> Tuple[str, np.ndarray]:
+    """Probabilidades del lote y la versión del modelo que las calculó."""
+    if settings.INFERENCE_MODE == "remote":
+        return get_client().predict(batch)
+    return predict_local(batch)
+
+
+def warmup(size: int = 224):
+    # Un lote de ceros: carga el modelo y compila el grafo antes del primer paciente
+    started = time.perf_counter()
+    predict(np.zeros((1, size, size, 3), dtype=np.float32))
+    _state.update(warmed=True, warmup_seconds=round(time.perf_counter() - started, 3))
+
+
+def status() -> dict:
+    if settings.INFERENCE_MODE == "remote":
+        try:
+            info = get_client().ping()
+        except Exception as e:
+            return {"mode": "remote", "ready": False, "error": repr(e)}
+        return {"mode": "remote", "ready": True, "server": info}
+    # Sin warm-up el modelo se carga con la primera petición: el proceso ya está listo
+    ready = _state["warmed"] if settings.MODEL_WARMUP else _state["error"] is None
+    return {"mode": "local", "ready": ready, "model": MODEL_PATH, **_state, "registry": registry.status()}
+
+
+def models_status() -> dict:
+    if settings.INFERENCE_MODE == "remote":
+        return get_client().models()
+    return registry.status()
@@ -0,0 +1,113 @@
+"""Servidor local de inferencia.
+
+Carga el modelo una vez por proceso de inferencia (no por worker HTTP) y
+atiende a los workers de la API por un socket local:
+
+    python -m app.inference_server
+
+Con ``INFERENCE_MODE=remote`` la API envía cada lote a este servidor en lugar
+de cargar el modelo en cada worker de uvicorn. Cada worker sigue la tabla
+model_deployments (``inference.sync_models``): debe usar la misma
+DATABASE_PATH que la API.
+"""
+from __future__ import annotations
+import logging
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.connection import Listener
+
+from app import inference
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker(counter, threads: int, pin_cpus: bool):
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    if pin_cpus and threads > 0 and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        assigned = cpus[index * threads:(index + 1) * threads]
+        if assigned:
+            os.sched_setaffinity(0, assigned)
+    inference.load_model(threads=threads)
+    if settings.MODEL_WARMUP:
+        inference.warmup()
+
+
+def _predict(batch):
+    return inference.predict_local(batch)
+
+
+def _models_status():
+    return inference.registry.status()
+
+
+def _ping(pool: ProcessPoolExecutor, workers: int):
+    # Versión que sirven los workers (cambia con model_deployments), no la de arranque
+    status = pool.submit(_models_status).result()
+    active = next((v for v in status["versions"] if v["version"] == status["active"]), None)
+    return {"workers": workers, "model": active["path"] if active else inference.MODEL_PATH,
+            "model_version": status["active"]}
+
+
+def _serve_connection(conn, pool: ProcessPoolExecutor, workers: int):
+    with conn:
+        while True:
+            try:
+                op, payload = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if op == "predict":
+                    conn.send(("ok", pool.submit(_predict, payload).result()))
+                elif op == "ping":
+                    conn.send(("ok", _ping(pool, workers)))
+                elif op == "models":
+                    conn.send(("ok", pool.submit(_models_status).result()))
+                else:
+                    conn.send(("error", f"unknown op {op!r}"))
+            except (EOFError, OSError):
+                return
+            except Exception as e:
+                conn.send(("error", repr(e)))
+
+
+def serve(address: str | None = None, workers: int | None = None,
+          threads: int | None = None, pin_cpus: bool | None = None):
+    key = inference.authkey()
+    address = inference.parse_address(address or settings.INFERENCE_ADDRESS)
+    workers = max(1, workers or settings.INFERENCE_WORKERS)
+    threads = settings.INFERENCE_THREADS_PER_WORKER if threads is None else threads
+    pin_cpus = settings.INFERENCE_PIN_CPUS if pin_cpus is None else pin_cpus
+
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)
+
+    # spawn: cada worker arranca limpio y carga su propia copia del modelo
+    ctx = mp.get_context("spawn")
+    counter = ctx.Value("i", 0)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(counter, threads, pin_cpus)) as pool:
+        # Fuerza la carga del modelo en todos los workers antes de aceptar tráfico
+        list(pool.map(_noop, range(workers)))
+        with Listener(address, authkey=key) as listener:
+            if isinstance(address, str):
+                # Socket unix: solo el usuario del servidor puede conectarse
+                os.chmod(address, 0o600)
+            logger.info("Inference server listening on %s with %d workers", address, workers)
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=_serve_connection, args=(conn, pool, workers), daemon=True).start()
+
+
+def _noop(_):
+    return None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve()
@@ -0,0 +1,93 @@
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.metrics import create_background_task
+
+logger = logging.getLogger(__name__)
+
+# Eventos por analysis_id para los clientes que hacen long-poll
+_finished: Dict[int, asyncio.Event] = {}
+
+
+def notify_finished(analysis_id: int):
+    event = _finished.pop(analysis_id, None)
+    if event is not None:
+        event.set()
+
+
+async def wait_finished(analysis_id: int, timeout: float) -> bool:
+    event = _finished.setdefault(analysis_id, asyncio.Event())
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        if _finished.get(analysis_id) is event and not event.is_set():
+            _finished.pop(analysis_id, None)
+        return False
+
+
+class AnalysisJobQueue:
+    """Cola local de trabajos por id atendida por ``workers`` tareas.
+
+    ``on_finished`` se llama con cada id procesado; por defecto despierta a
+    los clientes de long-poll del análisis. ``label`` identifica la cola en
+    los logs.
+    """
+
+    def __init__(self, handler: Callable[[int], Awaitable[Any]], workers: int = 2,
+                 on_finished: Optional[Callable[[int], Any]] = notify_finished,
+                 label: str = "Analysis"):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.on_finished = on_finished
+        self.label = label
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        # Ids en cola: la búsqueda periódica de trabajos abandonados no los duplica
+        self._queued: set[int] = set()
+        self._processed = 0
+        self._failed = 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._queued = set()
+            self._tasks = []
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(create_background_task(self._work(), loop))
+
+    def enqueue(self, analysis_id: int):
+        self._ensure_started()
+        if analysis_id in self._queued:
+            return
+        self._queued.add(analysis_id)
+        self._queue.put_nowait(analysis_id)
+
+    async def _work(self):
+        while True:
+            analysis_id = await self._queue.get()
+            self._queued.discard(analysis_id)
+            try:
+                await self.handler(analysis_id)
+                self._processed += 1
+            except Exception:
+                self._failed += 1
+                logger.exception("%s job %s failed", self.label, analysis_id)
+            finally:
+                if self.on_finished is not None:
+                    self.on_finished(analysis_id)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "processed": self._processed,
+            "failed": self._failed,
+        }
@@ -0,0 +1,9 @@
+# Configuración médica fija - basada en validación clínica
+class MedicalModelConfig:
+    CLINICAL_THRESHOLD = 0.30  # Sensibilidad: 100%, Especificidad: 77.3%
+    VALIDATION_METRICS = {
+        "sensitivity": 1.000,
+        "specificity": 0.773,
+        "auc": 0.9999,
+        "validation_samples": 2924
+    }
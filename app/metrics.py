@@ -0,0 +1,228 @@
+"""Métricas de la API en formato Prometheus y cabecera Server-Timing.
+
+- ``stage("decode")``: mide una etapa, la suma al histograma de etapas y la
+  anota en la petición en curso (cabecera ``Server-Timing``).
+- ``db_timer(tabla, operación)``: lo mismo para las consultas de app.database.
+- ``MetricsMiddleware``: duración por ruta y la cabecera ``Server-Timing``.
+- ``render()``: texto para ``GET /metrics``.
+
+Las anotaciones de la petición viajan en un ContextVar; app.executors copia
+el contexto al pool de CPU y a los hilos de SQLite para que las etapas que
+corren fuera del event loop también se registren.
+"""
+from __future__ import annotations
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from app.config import settings
+
+# Límites en segundos
+DEFAULT_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = list(buckets)
+        self._lock = threading.Lock()
+        # labels -> [conteos por bucket..., +Inf], suma
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total:.6f}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Valor leído al exportar: ``fn`` devuelve un número o {etiqueta: número}.
+
+    Con ``kind="counter"`` sirve para contadores que ya lleva otro módulo
+    (p.ej. aciertos del caché de predicciones).
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable, labelname: str | None = None, kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelname = labelname
+        self.kind = kind
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.fn()
+        if isinstance(value, dict):
+            for label, v in sorted(value.items(), key=lambda item: str(item[0])):
+                lines.append(f"{self.name}{_format_labels([self.labelname], [label])} {v}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+REGISTRY: list = []
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = ()) -> Histogram:
+    metric = Histogram(name, help, labelnames)
+    REGISTRY.append(metric)
+    return metric
+
+
+def gauge(name: str, help: str, fn: Callable, labelname: str | None = None, kind: str = "gauge") -> Gauge:
+    metric = Gauge(name, help, fn, labelname, kind)
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_SECONDS = histogram(
+    "ovadetect_http_request_seconds", "Duración de las peticiones HTTP", ["method", "route", "status"])
+STAGE_SECONDS = histogram(
+    "ovadetect_stage_seconds", "Duración de cada etapa del análisis (lectura, escritura, decode, CLAHE, modelo, base)",
+    ["stage"])
+DB_QUERY_SECONDS = histogram(
+    "ovadetect_db_query_seconds", "Duración de las consultas SQLite", ["table", "operation"])
+
+
+# --- Server-Timing por petición ---
+
+# Lista de (nombre, segundos) de la petición en curso; None fuera de una petición
+_timings: contextvars.ContextVar[list | None] = contextvars.ContextVar("ovadetect_timings", default=None)
+
+
+def _annotate(name: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))  # list.append es atómico: sirve desde otros hilos
+
+
+def create_background_task(coro, loop: asyncio.AbstractEventLoop | None = None) -> asyncio.Task:
+    # Tareas que sobreviven a la petición que las crea (workers de colas, cargas
+    # en segundo plano): contexto vacío, así no heredan su lista de Server-Timing
+    # ni la hacen crecer con cada trabajo posterior
+    loop = loop or asyncio.get_running_loop()
+    return contextvars.Context().run(loop.create_task, coro)
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        _annotate(name, elapsed)
+
+
+@contextmanager
+def db_timer(table: str, operation: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        DB_QUERY_SECONDS.observe(elapsed, table, operation)
+        _annotate("sql", elapsed)
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    # Etapas repetidas (una por archivo, una por consulta) se suman; las que
+    # corren en paralelo pueden sumar más que "total"
+    merged: Dict[str, List[float]] = {}
+    for name, seconds in timings:
+        entry = merged.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    parts = [f'{name};dur={seconds * 1000:.2f};desc="x{count}"' for name, (seconds, count) in merged.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def route_template(scope) -> str:
+    # Plantilla de la ruta ("/api/v1/image_files/{image_id}"), no la URL: cardinalidad acotada.
+    # Las versiones nuevas de FastAPI dejan en scope["route"] la ruta sin el
+    # prefijo de include_router; la ruta efectiva sí lo lleva
+    effective = (scope.get("fastapi") or {}).get("effective_route_context")
+    route = effective or scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI puro (no BaseHTTPMiddleware): no rompe StreamingResponse ni FileResponse."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings: list = []
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING:
+                    header = server_timing_header(timings, time.perf_counter() - started)
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"],
+                                         route_template(scope), str(status))
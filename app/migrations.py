@@ -1,3 +1,22 @@
+"""Migraciones versionadas del esquema SQLite.
+
+La versión aplicada se guarda en ``PRAGMA user_version`` y cada paso corre una
+sola vez al iniciar (``database.ensure_db``), o a mano con:
+
+    python -m app.migrations
+
+Los pasos deben ser idempotentes: las bases creadas antes de este esquema
+versionado arrancan en ``user_version = 0`` aunque ya tengan parte de los
+cambios.
+"""
+from __future__ import annotations
+import ast
+import hashlib
+import json
+import sqlite3
+from contextlib import contextmanager
+from typing import Callable, List
+
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -26,12 +45,366 @@ CREATE TABLE IF NOT EXISTS analysis_results (
     image_id INTEGER NOT NULL,
     pcos_probability REAL NOT NULL,
     confidence REAL NOT NULL,
-    findings TEXT,            -- Podemos guardar como JSON string
-    recommendations TEXT,     -- También como JSON string
+    findings TEXT,            -- JSON: {"diagnosis": ..., "requires_review": ...}
+    recommendations TEXT,     -- JSON: lista de textos
     analyzed_at TEXT NOT NULL, -- Se guarda como ISO string
     status TEXT CHECK(status IN ('pending', 'processing', 'completed', 'error')) NOT NULL,
     error TEXT,
     FOREIGN KEY (image_id) REFERENCES image_files(id) ON DELETE CASCADE
 );
 
-"""
\ No newline at end of file
+"""
+
+# Búsqueda por nombre: tabla FTS5 (tokenizer trigram, sirve para subcadenas
+# como LIKE '%x%') sincronizada con triggers
+FTS_TABLES = {
+    "image_files": "image_files_fts",
+    "users": "users_fts",
+}
+
+def fts_schema(table_name: str, fts_table: str) -> str:
+    return f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+    name, content='{table_name}', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table_name} BEGIN
+    INSERT INTO {fts_table}(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table_name} BEGIN
+    INSERT INTO {fts_table}({fts_table}, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF name ON {table_name} BEGIN
+    INSERT INTO {fts_table}({fts_table}, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO {fts_table}(rowid, name) VALUES (new.id, new.name);
+END;
+"""
+
+
+# --- Utilidades para los pasos ---
+
+def add_column(conn: sqlite3.Connection, table_name: str, column: str, definition: str):
+    # table_xinfo también lista las columnas generadas
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table_name})")}
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}")
+
+def create_index(conn: sqlite3.Connection, name: str, table_name: str, columns: str):
+    # Un índice por transacción: los escritores esperan (busy_timeout) solo lo
+    # que tarda cada índice y no toda la migración
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table_name}({columns})")
+    conn.commit()
+
+def backfill(conn: sqlite3.Connection, table_name: str, columns: str,
+             update: Callable[[sqlite3.Row], dict | None], where: str = "1",
+             chunk_size: int = 1000) -> int:
+    """Recorre la tabla por rangos de id y confirma cada trozo por separado.
+
+    ``update`` recibe cada fila y devuelve las columnas a cambiar (o None).
+    Entre trozos se libera el lock de escritura para no bloquear la API.
+    """
+    conn.row_factory = sqlite3.Row
+    last_id = 0
+    updated = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, {columns} FROM {table_name} WHERE id > ? AND ({where}) ORDER BY id LIMIT ?",
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            return updated
+        for row in rows:
+            values = update(row)
+            if values:
+                set_clause = ", ".join(f"{col} = ?" for col in values)
+                conn.execute(f"UPDATE {table_name} SET {set_clause} WHERE id = ?", [*values.values(), row["id"]])
+                updated += 1
+        conn.commit()
+        last_id = rows[-1]["id"]
+
+
+# --- Pasos ---
+
+def _initial_schema(conn, chunk_size):
+    conn.executescript(SCHEMA)
+
+def _content_hash(conn, chunk_size):
+    add_column(conn, "image_files", "content_hash", "TEXT")  # SHA-256 del archivo, para deduplicar
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS prediction_cache (
+        content_hash TEXT NOT NULL,
+        model_version TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        probability REAL NOT NULL,  -- Salida cruda del modelo
+        created_at TEXT NOT NULL,
+        PRIMARY KEY (content_hash, model_version, threshold)
+    );
+    """)
+    create_index(conn, "idx_image_files_content_hash", "image_files", "content_hash")
+
+def _listing_indexes(conn, chunk_size):
+    create_index(conn, "idx_image_files_status_uploaded_at", "image_files", "status, uploaded_at")
+    create_index(conn, "idx_analysis_results_image_id", "analysis_results", "image_id")
+    create_index(conn, "idx_analysis_results_status_analyzed_at", "analysis_results", "status, analyzed_at")
+
+def _name_search(conn, chunk_size):
+    for table_name, fts_table in FTS_TABLES.items():
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+        ).fetchone()
+        try:
+            conn.executescript(fts_schema(table_name, fts_table))
+            if not exists:
+                # Tabla nueva sobre datos existentes: se indexan las filas actuales
+                conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+            conn.commit()
+        except sqlite3.OperationalError:
+            # SQLite sin FTS5/trigram: la búsqueda sigue usando LIKE
+            conn.rollback()
+
+def _backfill_content_hash(conn, chunk_size):
+    def hash_file(row):
+        try:
+            with open(row["url"], "rb") as f:
+                return {"content_hash": hashlib.file_digest(f, "sha256").hexdigest()}
+        except OSError:
+            return None
+    backfill(conn, "image_files", "url", hash_file, where="content_hash IS NULL", chunk_size=chunk_size)
+
+
+def _export_index(conn, chunk_size):
+    # Export incremental por analyzed_at (el id va implícito en el índice)
+    create_index(conn, "idx_analysis_results_analyzed_at", "analysis_results", "analyzed_at")
+
+
+def _legacy_to_json(value):
+    # findings/recommendations se guardaban con str(): repr de Python, no JSON
+    try:
+        return json.dumps(ast.literal_eval(value), ensure_ascii=False)
+    except (ValueError, SyntaxError):
+        return json.dumps(value, ensure_ascii=False)
+
+def _json_findings(conn, chunk_size):
+    def convert(row):
+        values = {}
+        if row["findings"] is not None and not row["findings_ok"]:
+            findings = json.loads(_legacy_to_json(row["findings"]))
+            if not isinstance(findings, dict):
+                findings = {"diagnosis": findings}
+            findings.setdefault("requires_review", row["confidence"] < 0.6)
+            values["findings"] = json.dumps(findings, ensure_ascii=False)
+        if row["recommendations"] is not None and not row["recommendations_ok"]:
+            values["recommendations"] = _legacy_to_json(row["recommendations"])
+        return values
+    backfill(
+        conn, "analysis_results",
+        "findings, recommendations, confidence, json_valid(findings) AS findings_ok, "
+        "json_valid(recommendations) AS recommendations_ok",
+        convert, where="NOT json_valid(findings) OR NOT json_valid(recommendations)",
+        chunk_size=chunk_size,
+    )
+    # Columnas generadas (VIRTUAL: no ocupan espacio) para filtrar y agregar
+    # en SQL sin parsear el JSON en Python
+    add_column(conn, "analysis_results", "diagnosis",
+               "TEXT GENERATED ALWAYS AS (CASE WHEN json_valid(findings) "
+               "THEN json_extract(findings, '$.diagnosis') END) VIRTUAL")
+    add_column(conn, "analysis_results", "requires_review",
+               "INTEGER GENERATED ALWAYS AS (CASE WHEN json_valid(findings) "
+               "THEN json_extract(findings, '$.requires_review') END) VIRTUAL")
+    conn.commit()
+    create_index(conn, "idx_analysis_results_diagnosis_analyzed_at", "analysis_results", "diagnosis, analyzed_at")
+    create_index(conn, "idx_analysis_results_requires_review_analyzed_at", "analysis_results",
+                 "requires_review, analyzed_at")
+
+
+# Resumen diario de analysis_results mantenido por triggers: los dashboards
+# leen O(días x estados x diagnósticos) filas en lugar de toda la tabla.
+# diagnosis '' = sin diagnóstico (NULL no sirve en la clave primaria)
+STATS_TABLE = "analysis_daily_stats"
+
+def _stats_delta(row: str, sign: str) -> str:
+    return f"""
+    INSERT INTO {STATS_TABLE} (day, status, diagnosis, total, positives, requires_review,
+                               sum_pcos_probability, sum_confidence,
+                               confidence_low, confidence_medium, confidence_high)
+    VALUES (substr({row}.analyzed_at, 1, 10), {row}.status, coalesce({row}.diagnosis, ''),
+            {sign}1,
+            {sign}({row}.diagnosis IS 'Infectado'),
+            {sign}coalesce({row}.requires_review, 0),
+            {sign}{row}.pcos_probability,
+            {sign}{row}.confidence,
+            {sign}({row}.confidence < 0.6),
+            {sign}({row}.confidence >= 0.6 AND {row}.confidence < 0.8),
+            {sign}({row}.confidence >= 0.8))
+    ON CONFLICT (day, status, diagnosis) DO UPDATE SET
+        total = total + excluded.total,
+        positives = positives + excluded.positives,
+        requires_review = requires_review + excluded.requires_review,
+        sum_pcos_probability = sum_pcos_probability + excluded.sum_pcos_probability,
+        sum_confidence = sum_confidence + excluded.sum_confidence,
+        confidence_low = confidence_low + excluded.confidence_low,
+        confidence_medium = confidence_medium + excluded.confidence_medium,
+        confidence_high = confidence_high + excluded.confidence_high;"""
+
+STATS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+    day TEXT NOT NULL,               -- YYYY-MM-DD de analyzed_at
+    status TEXT NOT NULL,
+    diagnosis TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    positives INTEGER NOT NULL DEFAULT 0,        -- diagnosis = 'Infectado'
+    requires_review INTEGER NOT NULL DEFAULT 0,
+    sum_pcos_probability REAL NOT NULL DEFAULT 0,
+    sum_confidence REAL NOT NULL DEFAULT 0,
+    confidence_low INTEGER NOT NULL DEFAULT 0,     -- < 0.6
+    confidence_medium INTEGER NOT NULL DEFAULT 0,  -- 0.6 - 0.8
+    confidence_high INTEGER NOT NULL DEFAULT 0,    -- >= 0.8
+    PRIMARY KEY (day, status, diagnosis)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_ai AFTER INSERT ON analysis_results BEGIN
+    {_stats_delta("new", "+")}
+END;
+CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_ad AFTER DELETE ON analysis_results BEGIN
+    {_stats_delta("old", "-")}
+END;
+CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_au
+AFTER UPDATE OF status, findings, confidence, pcos_probability, analyzed_at ON analysis_results BEGIN
+    {_stats_delta("old", "-")}
+    {_stats_delta("new", "+")}
+END;
+"""
+
+def _daily_stats(conn, chunk_size):
+    # Tabla, triggers y carga inicial en la misma transacción: ninguna
+    # escritura concurrente queda fuera del resumen ni se cuenta dos veces
+    conn.executescript(f"""
+    BEGIN IMMEDIATE;
+    {STATS_SCHEMA}
+    DELETE FROM {STATS_TABLE};
+    INSERT INTO {STATS_TABLE}
+    SELECT substr(analyzed_at, 1, 10), status, coalesce(diagnosis, ''), COUNT(*),
+           SUM(diagnosis IS 'Infectado'), SUM(coalesce(requires_review, 0)),
+           SUM(pcos_probability), SUM(confidence),
+           SUM(confidence < 0.6), SUM(confidence >= 0.6 AND confidence < 0.8), SUM(confidence >= 0.8)
+    FROM analysis_results
+    GROUP BY 1, 2, 3;
+    COMMIT;
+    """)
+
+
+# Versión fija que tenía el modelo antes del registro de versiones
+LEGACY_MODEL_VERSION = "1.0"
+
+def _model_version(conn, chunk_size):
+    add_column(conn, "analysis_results", "model_version", "TEXT")  # NULL mientras el análisis está pendiente
+    conn.commit()
+    backfill(conn, "analysis_results", "model_version", lambda row: {"model_version": LEGACY_MODEL_VERSION},
+             where="status = 'completed' AND model_version IS NULL", chunk_size=chunk_size)
+    # Comparar versiones (p.ej. positividad antes y después de un cambio de modelo)
+    create_index(conn, "idx_analysis_results_model_version_analyzed_at", "analysis_results",
+                 "model_version, analyzed_at")
+
+
+def _derivatives_error(conn, chunk_size):
+    # Error al generar miniatura/tensor: esas imágenes no se reencolan al arrancar
+    add_column(conn, "image_files", "derivatives_error", "TEXT")
+
+
+def _model_deployments(conn, chunk_size):
+    # Estado deseado de las versiones del modelo: lo escriben los endpoints
+    # /models y lo sigue cada proceso que ejecuta el modelo
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS model_deployments (
+            version TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            backend TEXT NOT NULL,
+            state TEXT CHECK(state IN ('standby', 'active', 'retired')) NOT NULL,
+            shadow_fraction REAL NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        )
+    """)
+
+
+def _job_leases(conn, chunk_size):
+    # Momento en que un worker reclamó el trabajo: con varios procesos cada
+    # análisis / derivado corre una vez y los abandonados se retoman al vencer
+    add_column(conn, "analysis_results", "claimed_at", "TEXT")
+    add_column(conn, "image_files", "derivatives_claimed_at", "TEXT")
+
+
+class Migration:
+    def __init__(self, version: int, description: str, apply: Callable[[sqlite3.Connection, int], None]):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Tablas iniciales", _initial_schema),
+    Migration(2, "image_files.content_hash y prediction_cache", _content_hash),
+    Migration(3, "Índices de listados", _listing_indexes),
+    Migration(4, "Búsqueda por nombre con FTS5", _name_search),
+    Migration(5, "Backfill de image_files.content_hash", _backfill_content_hash),
+    Migration(6, "Índice de analysis_results.analyzed_at para exportar", _export_index),
+    Migration(7, "findings/recommendations en JSON y columnas diagnosis/requires_review", _json_findings),
+    Migration(8, "Resumen diario analysis_daily_stats con triggers", _daily_stats),
+    Migration(9, "analysis_results.model_version", _model_version),
+    Migration(10, "image_files.derivatives_error", _derivatives_error),
+    Migration(11, "model_deployments: versión activa y en sombra compartida", _model_deployments),
+    Migration(12, "analysis_results.claimed_at e image_files.derivatives_claimed_at", _job_leases),
+]
+
+
+# Espera máxima por el lock de migración: un backfill grande puede tardar
+MIGRATION_LOCK_SECONDS = 3600
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+@contextmanager
+def migration_lock(conn: sqlite3.Connection):
+    # Los pasos confirman por trozos para no bloquear a la API, así que el
+    # lock de escritura de la base no sirve para serializarlos entre procesos:
+    # se usa un lock exclusivo sobre un archivo aparte (<base>-migrate)
+    path = next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main")
+    if not path:
+        # Base en memoria: no la comparte ningún otro proceso
+        yield
+        return
+    lock = sqlite3.connect(f"{path}-migrate", timeout=MIGRATION_LOCK_SECONDS, isolation_level=None)
+    try:
+        lock.execute("BEGIN EXCLUSIVE")
+        yield
+    finally:
+        lock.close()
+
+def migrate(conn: sqlite3.Connection, chunk_size: int = 1000) -> List[int]:
+    applied = []
+    if get_version(conn) >= MIGRATIONS[-1].version:
+        return applied
+    # Varios workers arrancan a la vez: uno migra y los demás esperan y, al
+    # entrar, releen user_version y saltan los pasos ya aplicados
+    with migration_lock(conn):
+        for migration in MIGRATIONS:
+            if migration.version <= get_version(conn):
+                continue
+            migration.apply(conn, chunk_size)
+            conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+            conn.commit()
+            applied.append(migration.version)
+    return applied
+
+
+if __name__ == "__main__":
+    from app.config import settings
+
+    conn = sqlite3.connect(settings.DATABASE_PATH)
+    try:
+        before = get_version(conn)
+        applied = migrate(conn, settings.MIGRATION_CHUNK_SIZE)
+        print(f"{settings.DATABASE_PATH}: version {before} -> {get_version(conn)}")
+        for migration in MIGRATIONS:
+            mark = "applied now" if migration.version in applied else "ok"
+            print(f"  {migration.version:>3}  {migration.description}  [{mark}]")
+    finally:
+        conn.close()
@@ -0,0 +1,264 @@
+"""Versiones del modelo cargadas en el proceso y cambio en caliente.
+
+Ciclo de vida de una versión:
+
+    loading -> ready -> active -> draining -> unloaded
+                  \\-> failed
+
+``load`` carga y calienta una versión sin tocar el tráfico; ``activate`` la
+pone a atender las predicciones nuevas de forma atómica. La versión anterior
+pasa a ``draining``: termina los lotes que ya tenía y se descarga sola al
+quedar sin uso. Una versión ``ready`` puede además evaluar en sombra una
+fracción de los lotes: su resultado solo se compara con el activo, nunca se
+devuelve.
+
+El registro es de un solo proceso: ``inference.sync_models`` lo alinea con
+la tabla model_deployments, compartida por todos los workers.
+"""
+from __future__ import annotations
+import gc
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from app.backends import InferenceBackend, backend_name_for, create_backend
+
+logger = logging.getLogger(__name__)
+
+
+class ModelVersion:
+    def __init__(self, version: str, path: str, backend: str):
+        self.version = version
+        self.path = path
+        self.backend_name = backend
+        self.model: InferenceBackend | None = None
+        self.state = "loading"
+        self.error: str | None = None
+        self.inflight = 0
+        self.predictions = 0
+        self.load_seconds: float | None = None
+        self.warmup_seconds: float | None = None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "backend": self.backend_name,
+            "state": self.state,
+            "error": self.error,
+            "inflight": self.inflight,
+            "predictions": self.predictions,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+        }
+
+
+class ModelRegistry:
+    def __init__(self, threshold: float, warmup_size: int = 224):
+        # Umbral clínico: la concordancia en sombra se mide en la clase, no solo en la probabilidad
+        self.threshold = threshold
+        self.warmup_size = warmup_size
+        self._lock = threading.Lock()
+        self._versions: Dict[str, ModelVersion] = {}
+        self._active: ModelVersion | None = None
+        self._shadow: ModelVersion | None = None
+        self._shadow_fraction = 0.0
+        # Un solo hilo para la sombra: si está ocupado el lote se omite, no se encola
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ovadetect-shadow")
+        self._shadow_busy = False
+        self._shadow_stats = self._empty_shadow_stats()
+
+    @staticmethod
+    def _empty_shadow_stats() -> Dict[str, Any]:
+        return {"batches": 0, "items": 0, "class_disagreements": 0, "sum_abs_diff": 0.0,
+                "max_abs_diff": 0.0, "skipped": 0, "errors": 0}
+
+    # --- carga y cambio de versión ---
+
+    def load(self, version: str, path: str, backend: str = "auto", threads: int = 0,
+             warmup: bool = True) -> ModelVersion:
+        """Carga (y calienta) una versión. Bloquea: llamar fuera del event loop."""
+        entry = ModelVersion(version, path, backend_name_for(path, backend))
+        with self._lock:
+            current = self._versions.get(version)
+            if current is not None and current.state not in ("unloaded", "failed"):
+                raise ValueError(f"La versión {version} ya está cargada ({current.state})")
+            self._versions[version] = entry
+
+        started = time.perf_counter()
+        try:
+            model = create_backend(path, backend, threads)
+            entry.load_seconds = round(time.perf_counter() - started, 3)
+            if warmup:
+                started = time.perf_counter()
+                model.predict(np.zeros((1, self.warmup_size, self.warmup_size, 3), dtype=np.float32))
+                entry.warmup_seconds = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            entry.state, entry.error = "failed", repr(e)
+            raise
+        with self._lock:
+            entry.model = model
+            entry.state = "ready"
+        logger.info("Model %s loaded from %s (%s)", version, path, entry.backend_name)
+        return entry
+
+    def activate(self, version: str):
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None or entry.state not in ("ready", "active"):
+                raise ValueError(f"La versión {version} no está lista para activarse")
+            previous, self._active = self._active, entry
+            entry.state = "active"
+            if self._shadow is entry:
+                self._shadow = None
+            if previous is None or previous is entry:
+                return
+            previous.state = "draining"
+            drained = previous.inflight == 0
+        logger.info("Model %s active (was %s)", version, previous.version)
+        if drained:
+            self._unload(previous)
+
+    def unload(self, version: str):
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None:
+                raise KeyError(version)
+            if entry is self._active:
+                raise ValueError(f"La versión {version} está activa: activar otra antes de descargarla")
+            if entry.state in ("unloaded", "failed", "loading"):
+                return
+            if self._shadow is entry:
+                self._shadow = None
+            entry.state = "draining"
+            drained = entry.inflight == 0
+        if drained:
+            self._unload(entry)
+
+    def _unload(self, entry: ModelVersion):
+        with self._lock:
+            if entry.state != "draining" or entry.inflight:
+                return
+            model, entry.model = entry.model, None
+            entry.state = "unloaded"
+        if model is not None:
+            model.close()
+            del model
+            gc.collect()
+        logger.info("Model %s unloaded", entry.version)
+
+    def set_shadow(self, version: str | None, fraction: float = 0.0):
+        with self._lock:
+            if version is None:
+                self._shadow, self._shadow_fraction = None, 0.0
+                return
+            entry = self._versions.get(version)
+            if entry is None or entry.state != "ready":
+                raise ValueError(f"La versión {version} no está lista para evaluarse en sombra")
+            self._shadow = entry
+            self._shadow_fraction = min(1.0, max(0.0, fraction))
+            self._shadow_stats = self._empty_shadow_stats()
+
+    # --- predicción ---
+
+    def _acquire(self) -> ModelVersion:
+        with self._lock:
+            entry = self._active
+            if entry is None or entry.model is None:
+                raise RuntimeError("No hay un modelo activo")
+            entry.inflight += 1
+            return entry
+
+    def _release(self, entry: ModelVersion, items: int):
+        with self._lock:
+            entry.inflight -= 1
+            entry.predictions += items
+            drained = entry.state == "draining" and entry.inflight == 0
+        if drained:
+            self._unload(entry)
+
+    def predict(self, batch: np.ndarray) -> Tuple[str, np.ndarray]:
+        # La versión se fija al empezar el lote: un cambio a mitad no lo parte
+        entry = self._acquire()
+        try:
+            probs = np.asarray(entry.model.predict(batch), dtype=np.float32)
+        finally:
+            self._release(entry, len(batch))
+        self._maybe_shadow(batch, probs)
+        return entry.version, probs
+
+    def _maybe_shadow(self, batch: np.ndarray, probs: np.ndarray):
+        with self._lock:
+            shadow = self._shadow
+            if shadow is None or random.random() >= self._shadow_fraction:
+                return
+            if self._shadow_busy:
+                self._shadow_stats["skipped"] += 1
+                return
+            self._shadow_busy = True
+            shadow.inflight += 1
+        # El lote del scheduler no se reutiliza, pero puede ser un mmap: se copia
+        self._shadow_pool.submit(self._run_shadow, shadow, np.array(batch), probs)
+
+    def _run_shadow(self, shadow: ModelVersion, batch: np.ndarray, reference: np.ndarray):
+        try:
+            probs = np.asarray(shadow.model.predict(batch), dtype=np.float32)
+            diff = np.abs(probs - reference)
+            disagreements = int(((probs > self.threshold) != (reference > self.threshold)).sum())
+            with self._lock:
+                stats = self._shadow_stats
+                stats["batches"] += 1
+                stats["items"] += len(batch)
+                stats["class_disagreements"] += disagreements
+                stats["sum_abs_diff"] += float(diff.sum())
+                stats["max_abs_diff"] = max(stats["max_abs_diff"], float(diff.max()))
+        except Exception:
+            logger.exception("Shadow prediction failed on model %s", shadow.version)
+            with self._lock:
+                self._shadow_stats["errors"] += 1
+        finally:
+            with self._lock:
+                self._shadow_busy = False
+            self._release(shadow, len(batch))
+
+    # --- estado ---
+
+    @property
+    def active_version(self) -> str | None:
+        active = self._active
+        return active.version if active is not None else None
+
+    @property
+    def shadow(self) -> Tuple[str | None, float]:
+        shadow = self._shadow
+        return (shadow.version if shadow is not None else None), self._shadow_fraction
+
+    def has_active(self) -> bool:
+        return self._active is not None
+
+    def state(self, version: str) -> str | None:
+        entry = self._versions.get(version)
+        return entry.state if entry is not None else None
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._shadow_stats)
+            sum_abs_diff = stats.pop("sum_abs_diff")
+            shadow = {
+                "version": self._shadow.version if self._shadow else None,
+                "fraction": self._shadow_fraction,
+                **stats,
+                "mean_abs_diff": round(sum_abs_diff / stats["items"], 6) if stats["items"] else None,
+                "class_agreement": round(1 - stats["class_disagreements"] / stats["items"], 4)
+                if stats["items"] else None,
+            }
+            return {
+                "active": self._active.version if self._active else None,
+                "shadow": shadow,
+                "versions": [entry.info() for entry in self._versions.values()],
+            }
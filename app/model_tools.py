@@ -0,0 +1,285 @@
+"""Conversión, cuantización y validación del modelo para los backends de inferencia.
+
+    python -m app.model_tools convert --format tflite --quantize int8 \\
+        --calibration-dir datos/calibracion --output ai/modelo_int8.tflite
+    python -m app.model_tools validate --model ai/modelo_int8.tflite --data datos/validacion
+
+``convert`` parte del modelo Keras actual (``ai/{MODEL_NAME}``). Cuantización:
+
+    none     pesos float32, solo cambia el runtime
+    dynamic  pesos int8, activaciones float (sin datos de calibración)
+    float16  pesos float16 (la mitad de tamaño, misma precisión práctica)
+    int8     pesos y activaciones int8, calibrado con --calibration-dir
+
+``validate`` corre el modelo sobre un conjunto separado (subcarpetas
+``infected/`` y ``notinfected/``) y compara sensibilidad/especificidad en
+``CLINICAL_THRESHOLD`` con las métricas validadas, la concordancia con el
+modelo de referencia, la latencia por imagen y la memoria. Termina con código 1
+si alguna métrica cae por debajo de la tolerancia.
+
+Requiere TensorFlow para convertir a TFLite, tf2onnx + onnxruntime para ONNX y
+onnxconverter-common para ONNX float16.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from app import preprocessing
+from app.backends import create_backend
+from app.inference import MODEL_PATH
+from app.medical import MedicalModelConfig
+
+# Clase 1 del modelo = "No Infectado"
+LABEL_FOLDERS = {"infected": 0, "notinfected": 1}
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def _image_paths(folder: str) -> List[str]:
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(folder)
+        for name in names
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def load_image(path: str) -> np.ndarray:
+    # Mismo preprocesamiento que la API
+    out = np.empty((preprocessing.IMG_SIZE, preprocessing.IMG_SIZE, 3), dtype=np.float32)
+    return preprocessing.preprocess_into(preprocessing.decode_image(np.fromfile(path, dtype=np.uint8)), out)
+
+
+def load_dataset(data_dir: str, limit: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    samples = []
+    for folder, label in LABEL_FOLDERS.items():
+        paths = _image_paths(os.path.join(data_dir, folder))
+        if limit:
+            paths = paths[:limit]
+        samples += [(path, label) for path in paths]
+    if not samples:
+        raise SystemExit(f"{data_dir}: no hay imágenes en {', '.join(LABEL_FOLDERS)}/")
+    images = np.stack([load_image(path) for path, _ in samples])
+    labels = np.array([label for _, label in samples], dtype=np.int8)
+    return images, labels
+
+
+def calibration_batches(calibration_dir: str, limit: int) -> Iterator[np.ndarray]:
+    paths = _image_paths(calibration_dir)[:limit]
+    if not paths:
+        raise SystemExit(f"{calibration_dir}: no hay imágenes de calibración")
+    for path in paths:
+        yield load_image(path)[np.newaxis]
+
+
+# --- convert ---
+
+def convert_tflite(source: str, output: str, quantize: str, calibration_dir: str | None, calibration_size: int):
+    import keras
+    import tensorflow as tf
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        saved_model = os.path.join(tmpdir, "saved_model")
+        keras.models.load_model(source).export(saved_model, format="tf_saved_model")
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model)
+        if quantize != "none":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantize == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantize == "int8":
+            converter.representative_dataset = lambda: ([batch] for batch in calibration_batches(calibration_dir, calibration_size))
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            # Entrada y salida siguen en float32: el backend no necesita cambios
+        with open(output, "wb") as f:
+            f.write(converter.convert())
+
+
+class _CalibrationReader:
+    # onnxruntime.quantization.CalibrationDataReader sin heredar (import diferido)
+    def __init__(self, input_name: str, batches: Iterator[np.ndarray]):
+        self.input_name = input_name
+        self.batches = batches
+
+    def get_next(self):
+        batch = next(self.batches, None)
+        return None if batch is None else {self.input_name: batch}
+
+
+def convert_onnx(source: str, output: str, quantize: str, calibration_dir: str | None, calibration_size: int):
+    import keras
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        float_path = os.path.join(tmpdir, "model.onnx")
+        keras.models.load_model(source).export(float_path, format="onnx")
+        if quantize == "none":
+            shutil.copyfile(float_path, output)
+        elif quantize == "float16":
+            import onnx
+            from onnxconverter_common import float16
+            onnx.save(float16.convert_float_to_float16(onnx.load(float_path), keep_io_types=True), output)
+        else:
+            from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+            prepared = os.path.join(tmpdir, "model.prep.onnx")
+            quant_pre_process(float_path, prepared)
+            if quantize == "dynamic":
+                quantize_dynamic(prepared, output, weight_type=QuantType.QInt8)
+            else:
+                import onnxruntime as ort
+                input_name = ort.InferenceSession(prepared, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+                reader = _CalibrationReader(input_name, calibration_batches(calibration_dir, calibration_size))
+                quantize_static(prepared, output, reader, quant_format=QuantFormat.QDQ,
+                                activation_type=QuantType.QInt8, weight_type=QuantType.QInt8,
+                                per_channel=True)
+
+
+CONVERTERS = {"tflite": convert_tflite, "onnx": convert_onnx}
+
+
+def cmd_convert(args) -> int:
+    if args.quantize == "int8" and not args.calibration_dir:
+        raise SystemExit("--quantize int8 requiere --calibration-dir")
+    output = args.output or os.path.splitext(args.source)[0] + (
+        "" if args.quantize == "none" else f"_{args.quantize}") + f".{args.format}"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    started = time.perf_counter()
+    CONVERTERS[args.format](args.source, output, args.quantize, args.calibration_dir, args.calibration_size)
+    print(json.dumps({
+        "source": args.source,
+        "output": output,
+        "format": args.format,
+        "quantize": args.quantize,
+        "source_mb": round(os.path.getsize(args.source) / 2**20, 2),
+        "output_mb": round(os.path.getsize(output) / 2**20, 2),
+        "seconds": round(time.perf_counter() - started, 1),
+    }, indent=2))
+    return 0
+
+
+# --- validate ---
+
+def _max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_model(path: str, backend: str, threads: int, images: np.ndarray, batch_size: int) -> dict:
+    rss_before = _max_rss_mb()
+    started = time.perf_counter()
+    model = create_backend(path, backend, threads)
+    load_seconds = time.perf_counter() - started
+    model.predict(images[:1])  # warm-up
+
+    single = []
+    for i in range(min(len(images), 50)):
+        t = time.perf_counter()
+        model.predict(images[i:i + 1])
+        single.append((time.perf_counter() - t) * 1000)
+
+    probs = []
+    started = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        probs.append(model.predict(images[i:i + batch_size]))
+    batch_seconds = time.perf_counter() - started
+    model.close()
+    return {
+        "model": path,
+        "backend": model.name,
+        "size_mb": round(os.path.getsize(path) / 2**20, 2),
+        "load_s": round(load_seconds, 3),
+        "latency_ms_batch1_p50": round(statistics.median(single), 2),
+        "latency_ms_per_image_batched": round(batch_seconds * 1000 / len(images), 2),
+        # Crecimiento del pico de memoria del proceso al cargar y ejecutar este modelo
+        "max_rss_growth_mb": round(_max_rss_mb() - rss_before, 1),
+        "probabilities": np.concatenate(probs).astype(np.float32),
+    }
+
+
+def clinical_metrics(probabilities: np.ndarray, labels: np.ndarray, threshold: float) -> dict:
+    pred_class = (probabilities > threshold).astype(np.int8)
+    infected, healthy = labels == 0, labels == 1
+    return {
+        "threshold": threshold,
+        "samples": int(len(labels)),
+        "sensitivity": round(float((pred_class[infected] == 0).mean()), 4) if infected.any() else None,
+        "specificity": round(float((pred_class[healthy] == 1).mean()), 4) if healthy.any() else None,
+    }
+
+
+def cmd_validate(args) -> int:
+    threshold = MedicalModelConfig.CLINICAL_THRESHOLD
+    images, labels = load_dataset(args.data, args.limit)
+
+    candidate = run_model(args.model, args.backend, args.threads, images, args.batch_size)
+    report = {"candidate": candidate, "metrics": clinical_metrics(candidate["probabilities"], labels, threshold)}
+    failures = []
+    for name in ("sensitivity", "specificity"):
+        expected = MedicalModelConfig.VALIDATION_METRICS[name]
+        value = report["metrics"][name]
+        if value is not None and value < expected - args.tolerance:
+            failures.append(f"{name} {value} < {expected} - {args.tolerance}")
+
+    if args.reference and os.path.abspath(args.reference) != os.path.abspath(args.model):
+        reference = run_model(args.reference, "auto", args.threads, images, args.batch_size)
+        diff = np.abs(candidate["probabilities"] - reference["probabilities"])
+        agreement = float(((candidate["probabilities"] > threshold) == (reference["probabilities"] > threshold)).mean())
+        report["reference"] = reference
+        report["reference_metrics"] = clinical_metrics(reference["probabilities"], labels, threshold)
+        report["agreement"] = {
+            "class_agreement": round(agreement, 4),
+            "max_abs_diff": round(float(diff.max()), 4),
+            "mean_abs_diff": round(float(diff.mean()), 5),
+            "latency_speedup": round(reference["latency_ms_batch1_p50"] / max(candidate["latency_ms_batch1_p50"], 1e-9), 2),
+        }
+        if agreement < args.min_agreement:
+            failures.append(f"class_agreement {agreement:.4f} < {args.min_agreement}")
+
+    for run in ("candidate", "reference"):
+        if run in report:
+            report[run].pop("probabilities")
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    return 1 if failures else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="exporta y cuantiza el modelo Keras")
+    convert.add_argument("--source", default=MODEL_PATH)
+    convert.add_argument("--format", choices=sorted(CONVERTERS), required=True)
+    convert.add_argument("--quantize", choices=["none", "dynamic", "float16", "int8"], default="none")
+    convert.add_argument("--calibration-dir", help="imágenes representativas para int8")
+    convert.add_argument("--calibration-size", type=int, default=200)
+    convert.add_argument("--output", help="por defecto junto al modelo de origen")
+    convert.set_defaults(func=cmd_convert)
+
+    validate = sub.add_parser("validate", help="valida un modelo sobre un conjunto separado")
+    validate.add_argument("--model", required=True)
+    validate.add_argument("--backend", default="auto")
+    validate.add_argument("--data", required=True, help="carpeta con infected/ y notinfected/")
+    validate.add_argument("--reference", default=MODEL_PATH, help="modelo de referencia ('' para omitir)")
+    validate.add_argument("--limit", type=int, default=0, help="imágenes por clase (0 = todas)")
+    validate.add_argument("--batch-size", type=int, default=32)
+    validate.add_argument("--threads", type=int, default=0)
+    validate.add_argument("--tolerance", type=float, default=0.02,
+                          help="caída máxima de sensibilidad/especificidad")
+    validate.add_argument("--min-agreement", type=float, default=0.99,
+                          help="concordancia mínima de clase con la referencia")
+    validate.set_defaults(func=cmd_validate)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, Json
 from datetime import datetime
-from typing import Any, Optional ,List
+from typing import Any, Dict, Optional ,List
 
 class User(BaseModel):
+    # SQLite devuelve los ids como enteros
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
     id: str
     name: str
     email: EmailStr
@@ -28,12 +31,12 @@ class ImageFileCreate(BaseModel):
     type: Optional[str] = None
     last_modified: Optional[int] = None
     url: Optional[str] = None
-    thumbnail: Optional[str] = None
     width: Optional[int] = None
     height: Optional[int] = None
     uploaded_at: Optional[datetime] = None
     status: Optional[str] = None
     error: Optional[str] = None
+    content_hash: Optional[str] = None
 
 class ImageFileUpdate(BaseModel):
     name: Optional[str] = None
@@ -41,7 +44,6 @@ class ImageFileUpdate(BaseModel):
     type: Optional[str] = None
     last_modified: Optional[int] = None
     url: Optional[str] = None
-    thumbnail: Optional[str] = None
     width: Optional[int] = None
     height: Optional[int] = None
     uploaded_at: Optional[datetime] = None
@@ -49,6 +51,9 @@ class ImageFileUpdate(BaseModel):
     error: Optional[str] = None
 
 class ImageFile(BaseModel):
+    # SQLite devuelve los ids como enteros
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
     id: str
     name: str
     size: int
@@ -61,6 +66,8 @@ class ImageFile(BaseModel):
     uploaded_at: datetime
     status: str  # 'uploading' | 'uploaded' | 'error' | 'processing'
     error: Optional[str] = None
+    content_hash: Optional[str] = None
+    derivatives_error: Optional[str] = None
 
 
 
@@ -68,33 +75,47 @@ class AnalysisResultCreate(BaseModel):
     image_id: Optional[str] = None
     pcos_probability: Optional[float] = None
     confidence: Optional[float] = None
-    findings: Optional[List[str]] = Field(default_factory=list)
+    findings: Optional[Dict[str, Any]] = None  # {"diagnosis": ..., "requires_review": ...}
     recommendations: Optional[List[str]] = Field(default_factory=list)
     analyzed_at: Optional[datetime] = None
     status: Optional[str] = None
     error: Optional[str] = None
+    model_version: Optional[str] = None
 
 class AnalysisResultUpdate(BaseModel):
     image_id: Optional[str] = None
     pcos_probability: Optional[float] = None
     confidence: Optional[float] = None
-    findings: Optional[List[str]] = Field(default_factory=list)
+    findings: Optional[Dict[str, Any]] = None  # {"diagnosis": ..., "requires_review": ...}
     recommendations: Optional[List[str]] = Field(default_factory=list)
     analyzed_at: Optional[datetime] = None
     status: Optional[str] = None
     error: Optional[str] = None
+    model_version: Optional[str] = None
 class AnalysisResult(BaseModel):
+    # SQLite devuelve los ids como enteros
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
     id: str
     image_id: str
     pcos_probability: float
     confidence: float
-    findings: List[str] = Field(default_factory=list)
-    recommendations: List[str] = Field(default_factory=list)
+    # Columnas JSON en SQLite: se validan y devuelven ya decodificadas
+    findings: Optional[Json[Dict[str, Any]]] = None  # NULL mientras el análisis está pendiente
+    recommendations: Optional[Json[List[str]]] = None
     analyzed_at: datetime
     status: str  # 'pending' | 'processing' | 'completed' | 'error'
     error: Optional[str] = None
+    model_version: Optional[str] = None  # NULL hasta completar el análisis
 
 class PagedResource(BaseModel):
     data: List[Any]
-    total_results: int
-    total_pages: int
\ No newline at end of file
+    total_results: Optional[int] = None  # None si se pidió include_count=false
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+class ModelLoad(BaseModel):
+    version: str
+    model_name: str  # archivo dentro de ai/
+    backend: str = "auto"  # keras | tflite | onnx | auto
+    activate: bool = False  # activar apenas termine la carga
+    shadow_fraction: float = Field(default=0.0, ge=0.0, le=1.0)  # evaluar en sombra (si no se activa)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict
+
+from app.repository import prediction_cache as cache_repository
+from app.repository.aio import prediction_cache as aio_cache_repository
+
+
+def content_hash(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """LRU en memoria de predicciones por (hash, versión del modelo, umbral).
+
+    Los fallos en memoria se buscan en la tabla ``prediction_cache`` de SQLite,
+    así el caché sobrevive a reinicios y se comparte entre workers.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max(0, max_size)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._db_hits = 0
+        self._misses = 0
+
+    def _remember(self, key, probability: float):
+        with self._lock:
+            self._entries[key] = probability
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, key) -> float | None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key]
+        return None
+
+    def _from_row(self, key, row) -> float | None:
+        if row is None:
+            with self._lock:
+                self._misses += 1
+            return None
+        with self._lock:
+            self._db_hits += 1
+        self._remember(key, row["probability"])
+        return row["probability"]
+
+    @staticmethod
+    def _filters(key) -> Dict[str, Any]:
+        return dict(zip(("content_hash", "model_version", "threshold"), key))
+
+    @staticmethod
+    def _row(key, probability: float) -> Dict[str, Any]:
+        return {
+            **PredictionCache._filters(key),
+            "probability": probability,
+            "created_at": datetime.now().isoformat(),
+        }
+
+    def get(self, content_hash: str, model_version: str, threshold: float) -> float | None:
+        key = (content_hash, model_version, threshold)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._from_row(key, cache_repository.get_cached_prediction(self._filters(key)))
+
+    def put(self, content_hash: str, model_version: str, threshold: float, probability: float):
+        key = (content_hash, model_version, threshold)
+        probability = float(probability)
+        cache_repository.save_cached_predictions([self._row(key, probability)])
+        self._remember(key, probability)
+
+    # Variantes async: los aciertos en memoria no salen del event loop y solo
+    # la consulta a SQLite pasa por los hilos de base de datos
+
+    async def aget(self, content_hash: str, model_version: str, threshold: float) -> float | None:
+        key = (content_hash, model_version, threshold)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._from_row(key, await aio_cache_repository.get_cached_prediction(self._filters(key)))
+
+    async def aput(self, content_hash: str, model_version: str, threshold: float, probability: float):
+        key = (content_hash, model_version, threshold)
+        probability = float(probability)
+        await aio_cache_repository.save_cached_predictions([self._row(key, probability)])
+        self._remember(key, probability)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "db_hits": self._db_hits,
+                "misses": self._misses,
+            }
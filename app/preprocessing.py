@@ -0,0 +1,102 @@
+from __future__ import annotations
+import threading
+from typing import Sequence
+
+import cv2
+import numpy as np
+
+from app import metrics
+
+IMG_SIZE = 224
+CLAHE_CLIP_LIMIT = 0.03
+CLAHE_TILE_GRID = (8, 8)
+# Medias de ImageNet en orden BGR (preprocess_input de VGG19, modo "caffe")
+VGG19_MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+# cv2.CLAHE no es thread-safe: una instancia por hilo del pool de CPU
+_local = threading.local()
+
+
+def get_clahe():
+    clahe = getattr(_local, "clahe", None)
+    if clahe is None:
+        clahe = _local.clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+    return clahe
+
+
+def vgg19_preprocess_input(x):
+    # Equivalente a keras.applications.vgg19.preprocess_input: RGB -> BGR y resta de medias
+    x = np.asarray(x, dtype=np.float32)[..., ::-1]
+    return x - VGG19_MEAN_BGR
+
+
+# --- Ruta original (float), usada en el entrenamiento ---
+
+def apply_clahe(image_array):
+    if image_array.dtype != np.uint8:
+        image_array = (image_array * 255).astype(np.uint8)
+    clahe = get_clahe()
+    if len(image_array.shape) == 3:
+        clahe_img = np.zeros_like(image_array)
+        for i in range(image_array.shape[2]):
+            clahe_img[:,:,i] = clahe.apply(image_array[:,:,i])
+        return clahe_img / 255.0
+    else:
+        return clahe.apply(image_array) / 255.0
+
+def enhanced_preprocessing(x):
+    x_clahe = apply_clahe(x)
+    return vgg19_preprocess_input(x_clahe * 255.0)
+
+
+# --- Ruta rápida: uint8 hasta el tensor float32 final ---
+
+def decode_original(data) -> np.ndarray:
+    """Decodifica bytes en memoria a un array BGR uint8 del tamaño original."""
+    # Sin rotar por EXIF: keras load_img (PIL) tampoco lo hacía y el modelo se entrenó así
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        raise ValueError("No se pudo decodificar la imagen")
+    return img
+
+
+def resize_for_model(img: np.ndarray, size: int = IMG_SIZE) -> np.ndarray:
+    # INTER_NEAREST_EXACT reproduce el "nearest" de PIL que usaba image.load_img
+    return cv2.resize(img, (size, size), interpolation=cv2.INTER_NEAREST_EXACT)
+
+
+def decode_image(data, size: int = IMG_SIZE) -> np.ndarray:
+    """Decodifica bytes en memoria a un array BGR uint8 de ``size`` x ``size``."""
+    return resize_for_model(decode_original(data), size)
+
+
+def preprocess_into(img_bgr: np.ndarray, out: np.ndarray) -> np.ndarray:
+    # La ruta float multiplica por 255 un array que ya está en 0-255 y el cast
+    # a uint8 se desborda a (-v) mod 256 (comportamiento x86). El modelo se
+    # entrenó así, de modo que se reproduce con una negación uint8.
+    inverted = np.negative(img_bgr)
+    clahe = get_clahe()
+    for c, channel in enumerate(cv2.split(inverted)):
+        np.subtract(clahe.apply(channel), VGG19_MEAN_BGR[c], out=out[:, :, c])
+    return out
+
+
+def preprocess_image(data) -> np.ndarray:
+    with metrics.stage("decode"):
+        img = decode_image(data)
+    with metrics.stage("clahe"):
+        return preprocess_into(img, np.empty((IMG_SIZE, IMG_SIZE, 3), dtype=np.float32))
+
+
+def preprocess_file(path: str) -> np.ndarray:
+    with metrics.stage("load"):
+        data = np.fromfile(path, dtype=np.uint8)
+    return preprocess_image(data)
+
+
+def preprocess_batch(images: Sequence, out: np.ndarray | None = None) -> np.ndarray:
+    if out is None:
+        out = np.empty((len(images), IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    for i, data in enumerate(images):
+        preprocess_into(decode_image(data), out[i])
+    return out
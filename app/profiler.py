@@ -0,0 +1,101 @@
+"""Profiler por muestreo que se enciende y apaga en caliente.
+
+Un hilo toma cada ``interval_ms`` la pila de todos los hilos del proceso
+(``sys._current_frames``) y cuenta las pilas repetidas. El costo es el de ese
+hilo, nada en el camino de las peticiones, así que puede correr con carga
+real. El resultado sale en formato "folded" (una pila por línea y su conteo),
+que leen flamegraph.pl, speedscope o inferno.
+"""
+from __future__ import annotations
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict
+
+MAX_DEPTH = 64
+# Un hilo cuyo frame más interno está en estos módulos está esperando trabajo
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stacks: Counter = Counter()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.interval = 0.01
+        self.samples = 0
+        self.idle = 0
+        self.started_at: float | None = None
+        self.stopped_at: float | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = 10.0, reset: bool = True):
+        with self._lock:
+            if self.running:
+                return
+            if reset:
+                self._stacks.clear()
+                self.samples = self.idle = 0
+            self.interval = max(1.0, interval_ms) / 1000
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ovadetect-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.stopped_at = time.time()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names.setdefault(thread.ident, thread.name)
+            sample, idle = [], 0
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if frame.f_code.co_filename.endswith(IDLE_FILES):
+                    idle += 1
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                # Se agrupa por nombre de hilo sin el número (ovadetect-cpu_3 -> ovadetect-cpu)
+                thread_name = names.get(ident, str(ident)).rsplit("_", 1)[0]
+                sample.append(";".join([thread_name, *reversed(stack)]))
+            with self._lock:
+                self._stacks.update(sample)
+                self.samples += 1
+                self.idle += idle
+
+    def folded(self, limit: int = 0) -> str:
+        with self._lock:
+            stacks = self._stacks.most_common(limit or None)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_ms": self.interval * 1000,
+                "samples": self.samples,
+                "idle_thread_samples": self.idle,
+                "distinct_stacks": len(self._stacks),
+                "started_at": self.started_at,
+                "stopped_at": self.stopped_at,
+            }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,26 @@
+# Versión async de app.repository.analysis_results
+from typing import Any, Dict, List
+from app import database as db
+from app.executors import run_db_read, run_db_write
+from app.repository import analysis_results as repo
+
+async def list_analysis_results(*args, **kwargs) -> db.PagedResource:
+    return await run_db_read(repo.list_analysis_results, *args, **kwargs)
+
+async def list_unfinished_analysis_ids(stale_before: str) -> List[int]:
+    return await run_db_read(repo.list_unfinished_analysis_ids, stale_before)
+
+async def claim_analysis_result(id: int, claimed_at: str, stale_before: str) -> bool:
+    return await run_db_write(repo.claim_analysis_result, id, claimed_at, stale_before)
+
+async def get_one_analysis_result(filters: Dict[str, str]) -> Dict[str, Any]:
+    return await run_db_read(repo.get_one_analysis_result, filters)
+
+async def create_analysis_results(data_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return await run_db_write(repo.create_analysis_results, data_rows)
+
+async def update_analysis_result(id: int, new_values: Dict[str, Any]) -> Dict[str, Any]:
+    return await run_db_write(repo.update_analysis_result, id, new_values)
+
+async def delete_analysis_results(ids: List[int]) -> int:
+    return await run_db_write(repo.delete_analysis_results, ids)
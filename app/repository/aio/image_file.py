@@ -0,0 +1,26 @@
+# Versión async de app.repository.image_file
+from typing import Any, Dict, List
+from app import database as db
+from app.executors import run_db_read, run_db_write
+from app.repository import image_file as repo
+
+async def list_image_files(*args, **kwargs) -> db.PagedResource:
+    return await run_db_read(repo.list_image_files, *args, **kwargs)
+
+async def list_image_ids_without_derivatives(stale_before: str) -> List[int]:
+    return await run_db_read(repo.list_image_ids_without_derivatives, stale_before)
+
+async def claim_image_derivatives(id: int, claimed_at: str, stale_before: str) -> bool:
+    return await run_db_write(repo.claim_image_derivatives, id, claimed_at, stale_before)
+
+async def get_one_image_file(filters: Dict[str, str]) -> Dict[str, Any]:
+    return await run_db_read(repo.get_one_image_file, filters)
+
+async def create_image_files(data_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return await run_db_write(repo.create_image_files, data_rows)
+
+async def update_image_file(id: int, new_values: Dict[str, Any]) -> Dict[str, Any]:
+    return await run_db_write(repo.update_image_file, id, new_values)
+
+async def delete_image_files(ids: List[int]) -> int:
+    return await run_db_write(repo.delete_image_files, ids)
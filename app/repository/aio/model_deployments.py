@@ -0,0 +1,10 @@
+# Versión async de app.repository.model_deployments
+from typing import Any, Dict, List
+from app.executors import run_db_read, run_db_write
+from app.repository import model_deployments as repo
+
+async def list_model_deployments() -> List[Dict[str, Any]]:
+    return await run_db_read(repo.list_model_deployments)
+
+async def save_model_deployments(data_rows: List[Dict[str, Any]]) -> int:
+    return await run_db_write(repo.save_model_deployments, data_rows)
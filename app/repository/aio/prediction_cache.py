@@ -0,0 +1,10 @@
+# Versión async de app.repository.prediction_cache
+from typing import Any, Dict, List
+from app.executors import run_db_read, run_db_write
+from app.repository import prediction_cache as repo
+
+async def get_cached_prediction(filters: Dict[str, Any]) -> Dict[str, Any]:
+    return await run_db_read(repo.get_cached_prediction, filters)
+
+async def save_cached_predictions(data_rows: List[Dict[str, Any]]) -> int:
+    return await run_db_write(repo.save_cached_predictions, data_rows)
@@ -0,0 +1,21 @@
+# Versión async de app.repository.users: mismas funciones, ejecutadas en los
+# hilos de base de datos (app.executors) sin bloquear el event loop
+from typing import Any, Dict, List
+from app import database as db
+from app.executors import run_db_read, run_db_write
+from app.repository import users as repo
+
+async def list_users(*args, **kwargs) -> db.PagedResource:
+    return await run_db_read(repo.list_users, *args, **kwargs)
+
+async def get_one_user(filters: Dict[str, str]) -> Dict[str, Any]:
+    return await run_db_read(repo.get_one_user, filters)
+
+async def create_users(data_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return await run_db_write(repo.create_users, data_rows)
+
+async def update_user(id: int, new_values: Dict[str, Any]) -> Dict[str, Any]:
+    return await run_db_write(repo.update_user, id, new_values)
+
+async def delete_users(ids: List[int]) -> int:
+    return await run_db_write(repo.delete_users, ids)
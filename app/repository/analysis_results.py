@@ -1,8 +1,22 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 from app import database as db
+from app.config import settings
+from app.migrations import STATS_TABLE
+
+# Columnas del export: el análisis más los datos de su imagen
+EXPORT_COLUMNS = [
+    "id", "image_id", "image_name", "image_url", "content_hash", "pcos_probability",
+    "confidence", "diagnosis", "requires_review", "findings", "recommendations",
+    "analyzed_at", "status", "error", "model_version",
+]
+# Columnas por las que se puede agrupar en count_analysis_results
+COUNT_GROUPS = ["diagnosis", "requires_review", "status", "model_version"]
+# Dimensiones del resumen diario (migrations.STATS_TABLE)
+STATS_GROUPS = ["day", "status", "diagnosis"]
 
 def list_analysis_results(fields: List[str], filters: Dict[str, str], order_by='updated_at',
-               order_dir='ASC', limit: int = 50, page: int = 1) -> db.PagedResource:
+               order_dir='ASC', limit: int = 50, page: int = 1, cursor: str = None,
+               include_count: bool = True) -> db.PagedResource:
     return db.list_all(
         "analysis_results",
         fields=fields,
@@ -10,17 +24,100 @@ def list_analysis_results(fields: List[str], filters: Dict[str, str], order_by='
         order_by=order_by,
         order_dir=order_dir,
         limit=limit,
-        page=page
+        page=page,
+        cursor=cursor,
+        include_count=include_count
     )
 
+# Sin reclamar, o reclamado por un worker cuyo lease venció
+UNCLAIMED = "status = 'pending' OR (status = 'processing' AND (claimed_at IS NULL OR claimed_at < ?))"
+
+def list_unfinished_analysis_ids(stale_before: str) -> List[int]:
+    rows = db.fetch_all(f"SELECT id FROM analysis_results WHERE {UNCLAIMED} ORDER BY id",
+                        [stale_before], "analysis_results")
+    return [row["id"] for row in rows]
+
+def claim_analysis_result(id: int, claimed_at: str, stale_before: str) -> bool:
+    return db.claim_one("analysis_results", id, {"status": "processing", "claimed_at": claimed_at},
+                        UNCLAIMED, [stale_before])
+
+def build_export_query(since: str = None, since_id: int = None, status: str = None):
+    conditions, params = [], []
+    if since is not None:
+        # Marca de agua (analyzed_at, id) de la última fila ya exportada
+        if since_id is not None:
+            conditions.append("(analysis_results.analyzed_at, analysis_results.id) > (?, ?)")
+            params.extend([since, since_id])
+        else:
+            conditions.append("analysis_results.analyzed_at > ?")
+            params.append(since)
+    if status is not None:
+        conditions.append("analysis_results.status = ?")
+        params.append(status)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    query = f"""
+        SELECT analysis_results.id, analysis_results.image_id,
+               image_files.name AS image_name, image_files.url AS image_url,
+               image_files.content_hash, analysis_results.pcos_probability,
+               analysis_results.confidence, analysis_results.diagnosis,
+               analysis_results.requires_review, analysis_results.findings,
+               analysis_results.recommendations, analysis_results.analyzed_at,
+               analysis_results.status, analysis_results.error,
+               analysis_results.model_version
+        FROM analysis_results
+        LEFT JOIN image_files ON image_files.id = analysis_results.image_id{where}
+        ORDER BY analysis_results.analyzed_at, analysis_results.id"""
+    return query, params
+
+def stream_analysis_results(since: str = None, since_id: int = None, status: str = None) -> Iterator[Dict[str, Any]]:
+    query, params = build_export_query(since, since_id, status)
+    return db.stream_query(query, params, settings.EXPORT_FETCH_SIZE, table="analysis_results")
+
+def count_analysis_results(group_by: str, filters: Dict[str, str], since: str = None,
+                           until: str = None) -> Dict[Any, int]:
+    if group_by not in COUNT_GROUPS:
+        raise ValueError(f"group_by debe ser uno de: {', '.join(COUNT_GROUPS)}.")
+    return db.count_by("analysis_results", group_by, filters, "analyzed_at", since, until)
+
+def build_stats_query(group_by: List[str], filters: Dict[str, str], since: str = None, until: str = None):
+    if not group_by or any(col not in STATS_GROUPS for col in group_by):
+        raise ValueError(f"group_by debe tomar valores de: {', '.join(STATS_GROUPS)}.")
+    conditions, params = [], []
+    for col, value in filters.items():
+        conditions.append(f"{col} = ?")
+        params.append(value)
+    # El resumen es diario: since es inclusivo y until exclusivo, por día
+    if since is not None:
+        conditions.append("day >= ?")
+        params.append(since[:10])
+    if until is not None:
+        conditions.append("day < ?")
+        params.append(until[:10])
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    columns = ", ".join(group_by)
+    query = f"""
+        SELECT {columns}, SUM(total) AS total, SUM(positives) AS positives,
+               SUM(requires_review) AS requires_review,
+               SUM(sum_pcos_probability) AS sum_pcos_probability, SUM(sum_confidence) AS sum_confidence,
+               SUM(confidence_low) AS confidence_low, SUM(confidence_medium) AS confidence_medium,
+               SUM(confidence_high) AS confidence_high
+        FROM {STATS_TABLE}{where}
+        GROUP BY {columns} HAVING SUM(total) > 0 ORDER BY {columns}"""
+    return query, params
+
+def get_analysis_stats(group_by: List[str], filters: Dict[str, str], since: str = None,
+                       until: str = None) -> List[Dict[str, Any]]:
+    query, params = build_stats_query(group_by, filters, since, until)
+    return db.fetch_all(query, params, table=STATS_TABLE)
+
 def get_one_analysis_result(filters: Dict[str, str]) -> Dict[str, Any]:
     return db.get_one("analysis_results", filters)
 
-def create_analysis_results(data_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    return db.create_many("analysis_results", data_rows)
+def create_analysis_results(data_rows: List[Dict[str, Any]], tx: db.UnitOfWork = None) -> List[Dict[str, Any]]:
+    return (tx or db).create_many("analysis_results", data_rows)
 
-def update_analysis_result(id: int, new_values: Dict[str, Any]) -> Dict[str, Any]:
-    return db.update_one("analysis_results", id, new_values)
+def update_analysis_result(id: int, new_values: Dict[str, Any], tx: db.UnitOfWork = None) -> Dict[str, Any]:
+    return (tx or db).update_one("analysis_results", id, new_values)
 
 def delete_analysis_results(ids: List[int]) -> int:
     return db.delete_many("analysis_results", ids)
@@ -2,7 +2,8 @@ from typing import Any, Dict, List
 from app import database as db
 
 def list_image_files(fields: List[str], filters: Dict[str, str], order_by='updated_at',
-               order_dir='ASC', limit: int = 50, page: int = 1) -> db.PagedResource:
+               order_dir='ASC', limit: int = 50, page: int = 1, cursor: str = None,
+               include_count: bool = True) -> db.PagedResource:
     return db.list_all(
         "image_files",
         fields=fields,
@@ -10,18 +11,33 @@ def list_image_files(fields: List[str], filters: Dict[str, str], order_by='updat
         order_by=order_by,
         order_dir=order_dir,
         limit=limit,
-        page=page
+        page=page,
+        cursor=cursor,
+        include_count=include_count
     )
 
+# Sin miniatura ni error, y sin reclamar (o con el lease del worker vencido)
+DERIVATIVES_UNCLAIMED = ("thumbnail IS NULL AND derivatives_error IS NULL "
+                         "AND (derivatives_claimed_at IS NULL OR derivatives_claimed_at < ?)")
+
+def list_image_ids_without_derivatives(stale_before: str) -> List[int]:
+    rows = db.fetch_all(
+        f"SELECT id FROM image_files WHERE status IN ('uploaded', 'processing') AND {DERIVATIVES_UNCLAIMED} ORDER BY id",
+        [stale_before], "image_files")
+    return [row["id"] for row in rows]
+
+def claim_image_derivatives(id: int, claimed_at: str, stale_before: str) -> bool:
+    return db.claim_one("image_files", id, {"derivatives_claimed_at": claimed_at}, DERIVATIVES_UNCLAIMED, [stale_before])
+
 def get_one_image_file(filters: Dict[str, str]) -> Dict[str, Any]:
     return db.get_one("image_files", filters)
 
-def create_image_files(data_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def create_image_files(data_rows: List[Dict[str, Any]], tx: db.UnitOfWork = None) -> List[Dict[str, Any]]:
             # Log removed for cleaner output
-    return db.create_many("image_files", data_rows)
+    return (tx or db).create_many("image_files", data_rows)
 
-def update_image_file(id: int, new_values: Dict[str, Any]) -> Dict[str, Any]:
-    return db.update_one("image_files", id, new_values)
+def update_image_file(id: int, new_values: Dict[str, Any], tx: db.UnitOfWork = None) -> Dict[str, Any]:
+    return (tx or db).update_one("image_files", id, new_values)
 
 def delete_image_files(ids: List[int]) -> int:
     return db.delete_many("image_files", ids)
@@ -0,0 +1,10 @@
+from typing import Any, Dict, List
+from app import database as db
+
+def list_model_deployments() -> List[Dict[str, Any]]:
+    return db.fetch_all("SELECT * FROM model_deployments ORDER BY updated_at", [], "model_deployments")
+
+def save_model_deployments(data_rows: List[Dict[str, Any]]) -> int:
+    # Todas las filas en una transacción: activar una versión y retirar la
+    # anterior se ve como un solo cambio desde los demás workers
+    return db.upsert_many("model_deployments", data_rows, ["version"])
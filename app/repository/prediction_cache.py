@@ -0,0 +1,8 @@
+from typing import Any, Dict, List
+from app import database as db
+
+def get_cached_prediction(filters: Dict[str, Any]) -> Dict[str, Any]:
+    return db.get_one("prediction_cache", filters)
+
+def save_cached_predictions(data_rows: List[Dict[str, Any]]) -> int:
+    return db.upsert_many("prediction_cache", data_rows, ["content_hash", "model_version", "threshold"])
@@ -1,6 +1,14 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
 from fastapi import APIRouter, HTTPException, Query, Path
-from typing import List, Optional, Dict
+from fastapi.responses import StreamingResponse
+from typing import Any, Iterator, List, Literal, Optional, Dict
+from app import jobs
 from app.repository import analysis_results as analysis_repo 
+from app.repository.aio import analysis_results as aio_analysis_repo
 from app.models import ImageFile, ImageFileCreate, ImageFileUpdate, PagedResource
 
 router = APIRouter()
@@ -12,16 +20,150 @@ def list_analysis_results_api(
     page: int = 1,
     order_by: str = "id",
     order_dir: str = "ASC",
-    filters: Optional[Dict[str, str]] = None
+    filters: Optional[Dict[str, str]] = None,
+    cursor: Optional[str] = None,
+    include_count: bool = True
 ):
-    return analysis_repo.list_analysis_results(
-        fields=fields,
-        filters=filters or {},
-        order_by=order_by,
-        order_dir=order_dir,
-        limit=limit,
-        page=page
+    try:
+        return analysis_repo.list_analysis_results(
+            fields=fields,
+            filters=filters or {},
+            order_by=order_by,
+            order_dir=order_dir,
+            limit=limit,
+            page=page,
+            cursor=cursor,
+            include_count=include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Se emite de a batch_size filas: cada trozo de un iterador sync es un salto al threadpool
+def ndjson_lines(rows: Iterator[Dict[str, Any]], batch_size: int = 500) -> Iterator[str]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, ensure_ascii=False) + "\n")
+        if len(lines) == batch_size:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+def csv_lines(rows: Iterator[Dict[str, Any]], batch_size: int = 500) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=analysis_repo.EXPORT_COLUMNS)
+    writer.writeheader()
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def check_iso_date(name: str, value: Optional[str]):
+    if value is not None:
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{name} debe ser una fecha ISO 8601.")
+
+# Declarada antes de /analysis_results/{image_id} para que "export" no se tome como id
+@router.get("/analysis_results/export")
+def export_analysis_results_api(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[str] = None,
+    since_id: Optional[int] = None,
+    status: Optional[str] = None
+):
+    # Export incremental: since/since_id = analyzed_at/id de la última fila recibida
+    check_iso_date("since", since)
+    rows = analysis_repo.stream_analysis_results(since, since_id, status)
+    if format == "csv":
+        return StreamingResponse(
+            csv_lines(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="analysis_results.csv"'},
+        )
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson")
+
+@router.get("/analysis_results/counts", response_model=Dict[str, Any])
+def count_analysis_results_api(
+    group_by: Literal["diagnosis", "requires_review", "status", "model_version"] = "diagnosis",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    diagnosis: Optional[str] = None,
+    requires_review: Optional[bool] = None,
+    status: Optional[str] = None,
+    model_version: Optional[str] = None
+):
+    # Conteos agregados en SQLite sobre las columnas generadas e indexadas,
+    # p.ej. ?diagnosis=Infectado&since=<hace una semana>
+    check_iso_date("since", since)
+    check_iso_date("until", until)
+    filters = {"diagnosis": diagnosis, "requires_review": requires_review, "status": status,
+               "model_version": model_version}
+    counts = analysis_repo.count_analysis_results(
+        group_by, {k: v for k, v in filters.items() if v is not None}, since, until
     )
+    if group_by == "requires_review":
+        counts = {None if value is None else bool(value): count for value, count in counts.items()}
+    return {
+        "group_by": group_by,
+        "since": since,
+        "until": until,
+        "total": sum(counts.values()),
+        "counts": [{group_by: value, "count": count} for value, count in counts.items()],
+    }
+
+def summarize_stats(row: Dict[str, Any]) -> Dict[str, Any]:
+    total = row.pop("total")
+    sum_pcos_probability = row.pop("sum_pcos_probability")
+    sum_confidence = row.pop("sum_confidence")
+    return {
+        **{col: row.pop(col) for col in list(row) if col in analysis_repo.STATS_GROUPS},
+        "total": total,
+        "positives": row["positives"],
+        "positivity_rate": round(row["positives"] / total, 4) if total else None,
+        "requires_specialist_review": row["requires_review"],
+        "avg_pcos_probability": round(sum_pcos_probability / total, 4) if total else None,
+        "avg_confidence": round(sum_confidence / total, 4) if total else None,
+        "confidence_levels": {
+            "Low": row["confidence_low"],
+            "Medium": row["confidence_medium"],
+            "High": row["confidence_high"],
+        },
+    }
+
+@router.get("/analysis_results/stats", response_model=Dict[str, Any])
+def analysis_results_stats_api(
+    group_by: List[Literal["day", "status", "diagnosis"]] = Query(["day"]),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    status: Optional[str] = "completed",  # status= (vacío) incluye todos
+    diagnosis: Optional[str] = None
+):
+    # Lee el resumen diario mantenido por triggers: cuesta O(buckets), no O(filas)
+    check_iso_date("since", since)
+    check_iso_date("until", until)
+    filters = {"status": status, "diagnosis": diagnosis}
+    try:
+        rows = analysis_repo.get_analysis_stats(
+            list(dict.fromkeys(group_by)), {k: v for k, v in filters.items() if v}, since, until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    totals = {key: 0 for key in ("total", "positives", "requires_review", "sum_pcos_probability",
+                                  "sum_confidence", "confidence_low", "confidence_medium", "confidence_high")}
+    for row in rows:
+        for key in totals:
+            totals[key] += row[key]
+    return {
+        "group_by": group_by,
+        "since": since,
+        "until": until,
+        "totals": summarize_stats(totals),
+        "buckets": [summarize_stats(row) for row in rows],
+    }
 
 @router.get("/analysis_results/{image_id}", response_model=ImageFile)
 def get_analysis_result_api(image_id: int):
@@ -30,6 +172,19 @@ def get_analysis_result_api(image_id: int):
         raise HTTPException(status_code=404, detail="analysis_result not found")
     return analysis_result
 
+@router.get("/analysis_results/{analysis_id}/wait", response_model=Dict[str, Any])
+async def wait_analysis_result_api(analysis_id: int, timeout: float = Query(30, ge=0, le=120)):
+    # Long-poll: responde en cuanto el análisis termina o al vencer el timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        analysis_result = await aio_analysis_repo.get_one_analysis_result({"id": analysis_id})
+        if not analysis_result:
+            raise HTTPException(status_code=404, detail="analysis_result not found")
+        remaining = deadline - time.monotonic()
+        if analysis_result["status"] in ("completed", "error") or remaining <= 0:
+            return analysis_result
+        await jobs.wait_finished(analysis_id, min(remaining, 1.0))
+
 @router.post("/analysis_results", response_model=List[ImageFile])
 def create_analysis_results_api(analysis_results: List[ImageFileCreate]):
     
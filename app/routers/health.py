@@ -0,0 +1,39 @@
+import logging
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from typing import Any, Dict
+from app import database, inference
+from app.executors import run_cpu, run_db_read, run_io
+from app.preprocessing import IMG_SIZE
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+async def warm_up_model():
+    # Corre en segundo plano desde el lifespan: /health/ready espera a que termine
+    try:
+        await run_cpu(inference.warmup, IMG_SIZE)
+    except Exception:
+        logger.exception("Model warm-up failed")
+
+def check_database():
+    database.get_connection().execute("SELECT 1").fetchone()
+
+@router.get("/health/live", response_model=Dict[str, Any])
+def liveness_api():
+    # El proceso responde: no depende del modelo ni de la base
+    return {"status": "ok"}
+
+@router.get("/health/ready", response_model=Dict[str, Any])
+async def readiness_api():
+    # En modo remote status() hace ping al servidor de inferencia: fuera del event loop
+    model = await run_io(inference.status)
+    try:
+        await run_db_read(check_database)
+        db_status = {"ready": True}
+    except Exception as e:
+        db_status = {"ready": False, "error": repr(e)}
+    ready = model["ready"] and db_status["ready"]
+    content = {"status": "ready" if ready else "not_ready", "model": model, "database": db_status}
+    return JSONResponse(status_code=200 if ready else 503, content=content)
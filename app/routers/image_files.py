@@ -1,29 +1,25 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from fastapi import APIRouter, File, HTTPException, Query, Path, UploadFile
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import APIRouter, File, HTTPException, Query, Path, Request, Response, UploadFile
+from fastapi.responses import FileResponse
 from typing import Any, List, Optional, Dict
 from app.repository import image_file as image_file_repositories 
 from app.models import ImageFile, ImageFileCreate, ImageFileUpdate, PagedResource
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.config import settings
-from keras.applications.vgg19 import preprocess_input, VGG19
-from keras.preprocessing import image
-from keras.layers import Dense, Flatten, Dropout
-from keras.models import load_model
+from app.database import unit_of_work
+from app import derivatives, inference, metrics, preprocessing
 from app.repository import analysis_results
-from keras.models import Model
-import cv2
-import numpy as np
-
-# Configuración médica fija - basada en validación clínica
-class MedicalModelConfig:
-    CLINICAL_THRESHOLD = 0.30  # Sensibilidad: 100%, Especificidad: 77.3%
-    MODEL_VERSION = "1.0"
-    VALIDATION_METRICS = {
-        "sensitivity": 1.000,
-        "specificity": 0.773,
-        "auc": 0.9999,
-        "validation_samples": 2924
-    }
+from app.repository.aio import analysis_results as aio_analysis_results, image_file as aio_image_files
+from app.executors import cpu_pool, run_cpu, run_db_read, run_db_write, run_io
+from app.jobs import AnalysisJobQueue
+from app.medical import MedicalModelConfig
+from app.prediction_cache import PredictionCache
+from app.scheduler import InferenceScheduler
 
 def calculate_medical_confidence(probability, threshold=MedicalModelConfig.CLINICAL_THRESHOLD):
     distance_from_threshold = abs(probability - threshold)
@@ -59,32 +55,32 @@ mime_types = {
     "bmp": "image/bmp",
     "tiff": "image/tiff",
 }
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
-IMG_SIZE = 224
 UPLOAD_FOLDER = "uploads"
-AI_FOLDER = "ai"
+UPLOAD_CHUNK_SIZE = settings.UPLOAD_CHUNK_SIZE_KB * 1024
+MAX_UPLOAD_BYTES = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-model = load_model(f"ai/{settings.MODEL_NAME}")
-
-def apply_clahe(image_array):
-    if image_array.dtype != np.uint8:
-        image_array = (image_array * 255).astype(np.uint8)
-    if len(image_array.shape) == 3:
-        clahe_img = np.zeros_like(image_array)
-        for i in range(image_array.shape[2]):
-            clahe = cv2.createCLAHE(clipLimit=0.03, tileGridSize=(8,8))
-            clahe_img[:,:,i] = clahe.apply(image_array[:,:,i])
-        return clahe_img / 255.0
-    else:
-        clahe = cv2.createCLAHE(clipLimit=0.03, tileGridSize=(8,8))
-        return clahe.apply(image_array) / 255.0
+UPLOAD_ROOT = os.path.realpath(UPLOAD_FOLDER)
+THUMBNAIL_ROOT = os.path.realpath(derivatives.THUMBNAIL_FOLDER)
 
-def enhanced_preprocessing(x):
-    x_clahe = apply_clahe(x)
-    return preprocess_input(x_clahe * 255.0)
+prediction_cache = PredictionCache(max_size=settings.PREDICTION_CACHE_SIZE)
 
+# Un solo scheduler por proceso: junta imágenes de peticiones concurrentes
+scheduler = InferenceScheduler(
+    inference.predict,
+    max_batch_size=settings.INFERENCE_BATCH_SIZE,
+    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+    executor=cpu_pool,
+    concurrency=settings.INFERENCE_WORKERS if settings.INFERENCE_MODE == "remote" else 1,
+)
 
 
+@router.get("/inference/stats", response_model=Dict[str, Any])
+def inference_stats_api():
+    return {**scheduler.stats(), "prediction_cache": prediction_cache.stats(), "model": inference.status()}
 
 @router.get("/image_files",  response_model=PagedResource)
 def list_image_files_api(
@@ -93,127 +89,400 @@ def list_image_files_api(
     page: int = 1,
     order_by: str = "id",
     order_dir: str = "ASC",
-    filters: Optional[Dict[str, str]] = None
+    filters: Optional[Dict[str, str]] = None,
+    cursor: Optional[str] = None,
+    include_count: bool = True
 ):
-    return image_file_repositories.list_image_files(
-        fields=fields,
-        filters=filters or {},
-        order_by=order_by,
-        order_dir=order_dir,
-        limit=limit,
-        page=page
-    )
-@router.post("/image_files/upload", response_model=Any)
-async def upload_files(files: List[UploadFile] = File(...)):
-    saved_files = {}
-    created_results = []
-    for file in files:
-        ext = os.path.splitext(file.filename)[1]  
-        timestamp = int(datetime.now().timestamp() * 1_000_000)
-        new_filename = f"{timestamp}{ext}"
-
-        file_path = os.path.join(UPLOAD_FOLDER, new_filename)
-        
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        saved_files[file.filename] = new_filename
-        
-    for original_file, file in saved_files.items():
-        img_path = f"uploads/{file}"
-        ext = os.path.splitext(img_path)[1]
-        img = image.load_img(img_path, target_size=(IMG_SIZE, IMG_SIZE))  
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-
-        img_array = enhanced_preprocessing(img_array[0])
-        img_array = np.expand_dims(img_array, axis=0) 
-
-        pred_prob = model.predict(img_array)[0][0]
-        threshold = MedicalModelConfig.CLINICAL_THRESHOLD
-        pred_class = int(pred_prob > threshold)
-        
-        confidence_score = calculate_medical_confidence(pred_prob, threshold)
-        requires_review = confidence_score < 0.6
-        
-        # --- Guardar en image_files ---
-        file_size = os.path.getsize(img_path)
-        last_modified = int(os.path.getmtime(img_path))
-        file_type = mime_types.get(ext, "application/octet-stream")
-        image_data = {
-            "name": original_file,
-            "size": file_size,
-            "type": file_type,
-            "last_modified": last_modified,
-            "url": img_path,
-            "thumbnail": None,
-            "width": IMG_SIZE,
-            "height": IMG_SIZE,
-            "uploaded_at": datetime.now().isoformat(),
-            "status": "uploaded",
-            "error": None
+    try:
+        return image_file_repositories.list_image_files(
+            fields=fields,
+            filters=filters or {},
+            order_by=order_by,
+            order_dir=order_dir,
+            limit=limit,
+            page=page,
+            cursor=cursor,
+            include_count=include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+def media_type_for(path):
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    return mime_types.get(ext, "application/octet-stream")
+
+def build_image_data(original_file, img_path, status, content_hash=None):
+    return {
+        "name": original_file,
+        "size": os.path.getsize(img_path),
+        "type": media_type_for(img_path),
+        "last_modified": int(os.path.getmtime(img_path)),
+        "url": img_path,
+        # Miniatura y dimensiones reales las completa process_derivatives
+        "thumbnail": None,
+        "width": None,
+        "height": None,
+        "uploaded_at": datetime.now().isoformat(),
+        "status": status,
+        "error": None,
+        "content_hash": content_hash
+    }
+
+def analyze_prediction(pred_prob):
+    threshold = MedicalModelConfig.CLINICAL_THRESHOLD
+    pred_class = int(pred_prob > threshold)
+    confidence_score = calculate_medical_confidence(pred_prob, threshold)
+    return {
+        "threshold": threshold,
+        "pred_class": pred_class,
+        "confidence_score": confidence_score,
+        "requires_review": confidence_score < 0.6,
+        "diagnosis": "No Infectado" if pred_class == 1 else "Infectado",
+        "clinical_recommendations": get_clinical_recommendation(confidence_score, pred_class),
+    }
+
+def build_analysis_values(pred_prob, analysis, model_version):
+    return {
+        "pcos_probability": float(1 - pred_prob),
+        "confidence": float(analysis["confidence_score"]),
+        "findings": json.dumps({
+            "diagnosis": analysis["diagnosis"],
+            "requires_review": analysis["requires_review"],
+        }, ensure_ascii=False),
+        "recommendations": json.dumps(analysis["clinical_recommendations"], ensure_ascii=False),
+        "analyzed_at": datetime.now().isoformat(),
+        "status": "completed",
+        "error": None,
+        "model_version": model_version,
+    }
+
+def build_image_result(created_image):
+    return {
+        "id": created_image["id"],
+        "name": created_image["name"],
+        "url": created_image["url"],
+        "size": created_image["size"],
+        "type": created_image["type"],
+        "width": created_image["width"],
+        "height": created_image["height"],
+        "uploaded_at": created_image["uploaded_at"],
+        "status": created_image["status"],
+        "error": created_image["error"],
+    }
+
+def build_medical_analysis(analysis_id, pred_prob, analysis, model_version):
+    confidence_score = analysis["confidence_score"]
+    requires_review = analysis["requires_review"]
+    return {
+        "id": analysis_id,
+        "diagnosis": analysis["diagnosis"],
+        "pcos_probability": round(float(1 - pred_prob), 4),
+        "confidence_score": round(float(confidence_score), 3),
+        "requires_specialist_review": requires_review,
+        "clinical_recommendations": analysis["clinical_recommendations"],
+
+        "model_validation": {
+            "threshold": analysis["threshold"],
+            "sensitivity": MedicalModelConfig.VALIDATION_METRICS["sensitivity"],
+            "specificity": MedicalModelConfig.VALIDATION_METRICS["specificity"],
+            "auc": MedicalModelConfig.VALIDATION_METRICS["auc"],
+            "model_version": model_version
+        },
+
+        "clinical_interpretation": {
+            "confidence_level": "High" if confidence_score >= 0.8 else "Medium" if confidence_score >= 0.6 else "Low",
+            "clinical_action": "Routine follow-up" if not requires_review else "Specialist consultation recommended",
+            "reliability": "Validated clinical threshold"
         }
-        
-        created_image = image_file_repositories.create_image_files([image_data])
-        
-        # --- Análisis médico ---
-        diagnosis = "No Infectado" if pred_class == 1 else "Infectado"
-        clinical_recommendations = get_clinical_recommendation(confidence_score, pred_class)
-
-        analysis_data = {
-            "image_id": int(created_image[0]["id"]),
-            "pcos_probability": float(1 - pred_prob),
-            "confidence": float(confidence_score),
-            "findings": str({"diagnosis": diagnosis}),
-            "recommendations": str(clinical_recommendations),
+    }
+
+def write_chunk(f, hasher, chunk):
+    # hashlib y write liberan el GIL: ambos fuera del event loop
+    hasher.update(chunk)
+    f.write(chunk)
+
+async def store_upload(file: UploadFile, file_path: str):
+    """Copia el archivo a ``file_path`` por trozos y devuelve su hash.
+
+    En memoria solo queda un trozo (UPLOAD_CHUNK_SIZE_KB) a la vez: la
+    decodificación lee después el archivo ya escrito.
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"{file.filename} exceeds {settings.MAX_UPLOAD_SIZE_MB} MB")
+    hasher = hashlib.sha256()
+    written = 0
+    f = await run_io(open, file_path, "wb")
+    try:
+        while True:
+            with metrics.stage("read"):
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"{file.filename} exceeds {settings.MAX_UPLOAD_SIZE_MB} MB")
+            with metrics.stage("write"):
+                await run_io(write_chunk, f, hasher, chunk)
+    except BaseException:
+        await run_io(f.close)
+        await run_io(remove_file, file_path)
+        raise
+    await run_io(f.close)
+    return hasher.hexdigest()
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def discard_unsaved(uploads):
+    # Archivos ya copiados a uploads/ cuya fila no llegó a crearse
+    for upload in uploads:
+        if upload["image"] is None:
+            await run_io(remove_file, upload["path"])
+
+def find_stored_analyses(uploads):
+    # Imagen y predicción ya conocidas: se reutiliza el análisis guardado
+    for upload in uploads:
+        upload["analysis"] = None
+        if upload["cached"] and upload["image"] is not None:
+            upload["analysis"] = analysis_results.get_one_analysis_result(
+                {"image_id": upload["image"]["id"], "status": "completed", "model_version": upload["model_version"]}
+            )
+        upload["reused"] = upload["analysis"] is not None
+
+def save_upload_rows(uploads, image_status, build_values):
+    new_images = [u for u in uploads if u["image"] is None]
+    image_rows = [build_image_data(u["name"], u["path"], image_status, u["hash"]) for u in new_images]
+    missing = [u for u in uploads if u["analysis"] is None]
+
+    # Imágenes y análisis de toda la petición en una sola transacción: si algo
+    # falla no quedan imágenes huérfanas
+    with unit_of_work() as tx:
+        for upload, created in zip(new_images, image_file_repositories.create_image_files(image_rows, tx=tx)):
+            upload["image"] = created
+        analysis_rows = [{"image_id": int(u["image"]["id"]), **build_values(u)} for u in missing]
+        for upload, created in zip(missing, analysis_results.create_analysis_results(analysis_rows, tx=tx)):
+            upload["analysis"] = created
+    return missing
+
+async def predict_image(img_path, content_hash):
+    # Devuelve (probabilidad, versión del modelo)
+    threshold = MedicalModelConfig.CLINICAL_THRESHOLD
+    model_version = inference.active_version()
+    # Sin versión conocida no se consulta el caché: se predice con la que cargue el modelo
+    if content_hash and model_version is not None:
+        cached = await prediction_cache.aget(content_hash, model_version, threshold)
+        if cached is not None:
+            return cached, model_version
+    # Reanálisis: se usa el tensor ya preprocesado si existe
+    tensor = derivatives.load_tensor(content_hash)
+    if tensor is None:
+        tensor = await run_cpu(preprocessing.preprocess_file, img_path)
+    with metrics.stage("predict"):
+        pred_prob, version = await scheduler.predict_versioned(tensor)
+    model_version = version or model_version or settings.MODEL_VERSION
+    if content_hash:
+        await prediction_cache.aput(content_hash, model_version, threshold, pred_prob)
+    return pred_prob, model_version
+
+def complete_analysis(analysis_id, image_id, values):
+    with unit_of_work() as tx:
+        analysis_results.update_analysis_result(analysis_id, values, tx=tx)
+        image_file_repositories.update_image_file(image_id, {"status": "uploaded"}, tx=tx)
+
+def lease_window():
+    # (ahora, límite): un trabajo reclamado antes del límite se considera abandonado
+    now = datetime.now()
+    return now.isoformat(), (now - timedelta(seconds=settings.JOB_LEASE_SECONDS)).isoformat()
+
+async def process_analysis(analysis_id: int):
+    # pending -> processing -> completed | error. El paso a processing es un
+    # UPDATE condicionado: con varios workers cada análisis corre una sola vez
+    claimed_at, stale_before = lease_window()
+    if not await aio_analysis_results.claim_analysis_result(analysis_id, claimed_at, stale_before):
+        return
+    pending = await aio_analysis_results.get_one_analysis_result({"id": analysis_id})
+    image_row = await aio_image_files.get_one_image_file({"id": pending["image_id"]})
+    try:
+        if not image_row:
+            raise ValueError(f"image_file {pending['image_id']} not found")
+        pred_prob, model_version = await predict_image(image_row["url"], image_row.get("content_hash"))
+    except Exception as e:
+        await aio_analysis_results.update_analysis_result(analysis_id, {
+            "status": "error",
+            "error": str(e),
             "analyzed_at": datetime.now().isoformat(),
-            "status": "completed",
-            "error": None
-        }
-        
-        a_result = analysis_results.create_analysis_results([analysis_data])
-        
-        result = {
-            "id": created_image[0]["id"],
-            "name": created_image[0]["name"],
-            "url": created_image[0]["url"],
-            "size": created_image[0]["size"],
-            "type": created_image[0]["type"],
-            "width": created_image[0]["width"],
-            "height": created_image[0]["height"],
-            "uploaded_at": created_image[0]["uploaded_at"],
-            "status": created_image[0]["status"],
-            "error": created_image[0]["error"],
-            
+        })
+        if image_row:
+            await aio_image_files.update_image_file(image_row["id"], {"status": "error", "error": str(e)})
+        raise
+
+    analysis = analyze_prediction(pred_prob)
+    await run_db_write(complete_analysis, analysis_id, image_row["id"],
+                       build_analysis_values(pred_prob, analysis, model_version))
+
+analysis_jobs = AnalysisJobQueue(process_analysis, workers=settings.ANALYSIS_WORKERS)
+
+async def resume_pending_analyses():
+    # Pendientes sin reclamar y los de workers caídos o reiniciados (lease
+    # vencido); process_analysis descarta los que otro worker ya reclamó
+    _, stale_before = lease_window()
+    for analysis_id in await aio_analysis_results.list_unfinished_analysis_ids(stale_before):
+        analysis_jobs.enqueue(analysis_id)
+
+async def process_derivatives(image_id: int):
+    claimed_at, stale_before = lease_window()
+    if not await aio_image_files.claim_image_derivatives(image_id, claimed_at, stale_before):
+        return
+    image_row = await aio_image_files.get_one_image_file({"id": image_id})
+    if not image_row or image_row["thumbnail"] or not image_row.get("content_hash"):
+        return
+    try:
+        values = await run_cpu(derivatives.build_derivatives, image_row["url"], image_row["content_hash"])
+    except Exception as e:
+        # Queda registrado: resume_pending_derivatives no la reintenta en cada arranque
+        await aio_image_files.update_image_file(image_id, {"derivatives_error": repr(e)})
+        raise
+    await aio_image_files.update_image_file(image_id, values)
+
+# Miniaturas, dimensiones y tensores fuera del camino de la petición
+derivative_jobs = AnalysisJobQueue(process_derivatives, workers=settings.DERIVATIVE_WORKERS, on_finished=None,
+                                   label="Derivatives")
+
+async def resume_pending_derivatives():
+    _, stale_before = lease_window()
+    for image_id in await aio_image_files.list_image_ids_without_derivatives(stale_before):
+        derivative_jobs.enqueue(image_id)
+
+async def recover_jobs():
+    # Sin esperar a un reinicio: cada JOB_LEASE_SECONDS se retoman los
+    # trabajos de workers caídos
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS)
+        try:
+            await resume_pending_analyses()
+            await resume_pending_derivatives()
+        except Exception:
+            logger.exception("Job recovery failed")
+
+
+@router.get("/analysis_jobs/stats", response_model=Dict[str, Any])
+def analysis_jobs_stats_api():
+    return analysis_jobs.stats()
+
+@router.get("/derivative_jobs/stats", response_model=Dict[str, Any])
+def derivative_jobs_stats_api():
+    return derivative_jobs.stats()
+
+@router.post("/image_files/upload", response_model=Any)
+async def upload_files(files: List[UploadFile] = File(...), background: bool = False):
+    uploads = []
+    try:
+        return await process_uploads(files, background, uploads)
+    except BaseException:
+        # Sin filas no quedan archivos huérfanos en uploads/
+        await discard_unsaved(uploads)
+        raise
+
+async def process_uploads(files: List[UploadFile], background: bool, uploads: list):
+    threshold = MedicalModelConfig.CLINICAL_THRESHOLD
+    # Versión activa al empezar la petición: clave del caché de predicciones
+    # (None si este worker aún no cargó el modelo: no se consulta el caché)
+    model_version = inference.active_version()
+    timestamp = int(datetime.now().timestamp() * 1_000_000)
+    # Respuesta en el orden de los archivos: (upload, repetido dentro de la petición)
+    order = []
+    by_hash = {}
+    # Un archivo a la vez: se guarda en disco por trozos mientras se lee, se
+    # busca por hash y, si hace falta inferencia, se preprocesa desde el disco
+    # antes de leer el siguiente
+    for i, file in enumerate(files):
+        ext = os.path.splitext(file.filename)[1]
+        path = f"uploads/{timestamp}_{i}{ext}"
+        file_hash = await store_upload(file, path)
+
+        # --- Deduplicación por contenido ---
+        first = by_hash.get(file_hash)
+        if first is not None:
+            # Mismo contenido dos veces en la petición: una sola imagen y un solo análisis
+            await run_io(remove_file, path)
+            order.append((first, True))
+            continue
+        upload = by_hash[file_hash] = {"name": file.filename, "path": path, "hash": file_hash, "image": None}
+        uploads.append(upload)
+        order.append((upload, False))
+        with metrics.stage("dedup"):
+            upload["image"] = await aio_image_files.get_one_image_file({"content_hash": upload["hash"]})
+            upload["pred_prob"] = (await prediction_cache.aget(upload["hash"], model_version, threshold)
+                                   if model_version is not None else None)
+        upload["cached"] = upload["pred_prob"] is not None
+        upload["model_version"] = model_version if upload["cached"] else None
+        if not upload["cached"] and not background:
+            # Recién escrito: se lee desde la caché de páginas del sistema
+            try:
+                upload["tensor"] = await run_cpu(preprocessing.preprocess_file, upload["path"])
+            except ValueError:
+                # No se pudo decodificar: 400 con el nombre y no se guarda nada de la petición
+                await run_io(remove_file, upload["path"])
+                raise HTTPException(status_code=400, detail=f"{file.filename} is not a valid image")
+        if upload["image"] is not None:
+            # El original ya está guardado: la copia nueva sobra
+            await run_io(remove_file, upload["path"])
+    new_uploads = [u for u in uploads if u["image"] is None]
+
+    if background:
+        # Se guardan las filas en 'pending' y se responde sin esperar al modelo
+        with metrics.stage("db"):
+            await run_db_read(find_stored_analyses, uploads)
+            created = await run_db_write(save_upload_rows, uploads, "processing", lambda u: {
+                "pcos_probability": 0.0,
+                "confidence": 0.0,
+                "findings": None,
+                "recommendations": None,
+                "analyzed_at": datetime.now().isoformat(),
+                "status": "pending",
+                "error": None
+            })
+        for upload in created:
+            analysis_jobs.enqueue(upload["analysis"]["id"])
+        for upload in new_uploads:
+            derivative_jobs.enqueue(upload["image"]["id"])
+        return [{
+            **build_image_result(upload["image"]),
             "medical_analysis": {
-                "id": a_result[0]["id"] if a_result else None,
-                "diagnosis": diagnosis,
-                "pcos_probability": round(float(1 - pred_prob), 4),
-                "confidence_score": round(float(confidence_score), 3),
-                "requires_specialist_review": requires_review,
-                "clinical_recommendations": clinical_recommendations,
-                
-                "model_validation": {
-                    "threshold": threshold,
-                    "sensitivity": MedicalModelConfig.VALIDATION_METRICS["sensitivity"],
-                    "specificity": MedicalModelConfig.VALIDATION_METRICS["specificity"],
-                    "auc": MedicalModelConfig.VALIDATION_METRICS["auc"],
-                    "model_version": MedicalModelConfig.MODEL_VERSION
-                },
-                
-                "clinical_interpretation": {
-                    "confidence_level": "High" if confidence_score >= 0.8 else "Medium" if confidence_score >= 0.6 else "Low",
-                    "clinical_action": "Routine follow-up" if not requires_review else "Specialist consultation recommended",
-                    "reliability": "Validated clinical threshold"
-                }
-            }
-        }
+                "id": upload["analysis"]["id"],
+                "status": upload["analysis"]["status"],
+                "cached": upload["reused"] or repeated,
+            },
+        } for upload, repeated in order]
 
-        created_results.append(result) 
+    misses = [u for u in uploads if not u["cached"]]
+    with metrics.stage("predict"):
+        predictions = await scheduler.predict_many_versioned([u.pop("tensor") for u in misses])
+    for upload, (pred_prob, version) in zip(misses, predictions):
+        upload["pred_prob"] = pred_prob
+        upload["model_version"] = version or model_version or settings.MODEL_VERSION
 
+    # --- Análisis médico ---
+    for upload in uploads:
+        upload["summary"] = analyze_prediction(upload["pred_prob"])
+    with metrics.stage("db"):
+        await asyncio.gather(*(prediction_cache.aput(u["hash"], u["model_version"], threshold, u["pred_prob"]) for u in misses))
+        await run_db_read(find_stored_analyses, uploads)
+        await run_db_write(save_upload_rows, uploads, "uploaded",
+                           lambda u: build_analysis_values(u["pred_prob"], u["summary"], u["model_version"]))
+    for upload in new_uploads:
+        derivative_jobs.enqueue(upload["image"]["id"])
 
-    return created_results
+    return [{
+        **build_image_result(upload["image"]),
+        "medical_analysis": {
+            **build_medical_analysis(upload["analysis"]["id"], upload["pred_prob"], upload["summary"],
+                                     upload["model_version"]),
+            "cached": upload["cached"] or repeated,
+        },
+    } for upload, repeated in order]
 
 @router.get("/image_files/{image_id}", response_model=ImageFile)
 def get_image_file_api(image_id: int):
@@ -222,6 +491,75 @@ def get_image_file_api(image_id: int):
         raise HTTPException(status_code=404, detail="image_file not found")
     return image_file
 
+THUMBNAIL_MAX_AGE = 86400
+IMAGE_MAX_AGE = 3600
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(request: Request, etag: str, mtime: float) -> bool:
+    # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+    if request.headers.get("if-none-match") is not None:
+        return etag_matches(request, etag)
+    header = request.headers.get("if-modified-since")
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def resolve_served_path(path: str, root: str = UPLOAD_ROOT):
+    # url se puede cambiar por PUT: solo se sirven archivos dentro de ``root``
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([real_path, root]) != root or not os.path.isfile(real_path):
+        return None
+    return real_path
+
+@router.api_route("/image_files/{image_id}/file", methods=["GET", "HEAD"])
+def get_image_file_content_api(image_id: int, request: Request):
+    image_file = image_file_repositories.get_one_image_file({"id": image_id})
+    if not image_file:
+        raise HTTPException(status_code=404, detail="image_file not found")
+    path = resolve_served_path(image_file["url"])
+    if path is None:
+        raise HTTPException(status_code=404, detail="file not found")
+    stat = os.stat(path)
+    headers = {
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": f"private, max-age={IMAGE_MAX_AGE}",
+    }
+    etag = f'"{image_file["content_hash"]}"' if image_file.get("content_hash") else None
+    if etag:
+        headers["ETag"] = etag
+        if not_modified(request, etag, stat.st_mtime):
+            return Response(status_code=304, headers=headers)
+    # FileResponse atiende Range/If-Range y envía el archivo por trozos (o con
+    # sendfile si el servidor soporta http.response.pathsend), sin cargarlo entero
+    return FileResponse(path, media_type=media_type_for(path), headers=headers, stat_result=stat)
+
+@router.get("/image_files/{image_id}/thumbnail")
+def get_image_thumbnail_api(image_id: int, request: Request):
+    image_file = image_file_repositories.get_one_image_file({"id": image_id})
+    if not image_file:
+        raise HTTPException(status_code=404, detail="image_file not found")
+    # La ruta sale del hash, no de la columna thumbnail: nunca se sirve un archivo fuera de thumbnails/
+    path = None
+    if image_file.get("content_hash"):
+        path = resolve_served_path(derivatives.thumbnail_path(image_file["content_hash"]), THUMBNAIL_ROOT)
+    if path is None:
+        raise HTTPException(status_code=404, detail="thumbnail not ready")
+    # El nombre lleva el hash del original y el tamaño: sirve como ETag fuerte
+    etag = f'"{os.path.splitext(os.path.basename(path))[0]}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={THUMBNAIL_MAX_AGE}"}
+    if not_modified(request, etag, os.path.getmtime(path)):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=derivatives.thumbnail_media_type(path), headers=headers)
+
 @router.post("/image_files", response_model=List[ImageFile])
 def create_image_files_api(image_files: List[ImageFileCreate]):
     
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict
+from app import metrics
+from app.config import settings
+from app.profiler import profiler
+from app.routers.image_files import analysis_jobs, derivative_jobs, prediction_cache, scheduler
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+metrics.gauge("ovadetect_inference_queue_depth", "Imágenes esperando lote en el scheduler",
+              lambda: scheduler.stats()["queue_depth"])
+metrics.gauge("ovadetect_job_queue_depth", "Trabajos en cola en segundo plano",
+              lambda: {"analysis": analysis_jobs.stats()["queued"],
+                       "derivatives": derivative_jobs.stats()["queued"]}, labelname="queue")
+metrics.gauge("ovadetect_prediction_cache_lookups_total", "Consultas al caché de predicciones",
+              lambda: {k: v for k, v in prediction_cache.stats().items() if k in ("hits", "db_hits", "misses")},
+              labelname="result", kind="counter")
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics_api():
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+def require_profiler():
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="profiler disabled (PROFILER_ENABLED=false)")
+
+@router.get("/debug/profiler", response_model=Dict[str, Any])
+def profiler_status_api():
+    require_profiler()
+    return profiler.status()
+
+@router.post("/debug/profiler/start", response_model=Dict[str, Any])
+def profiler_start_api(interval_ms: float = Query(10.0, ge=1.0, le=1000.0), reset: bool = True):
+    require_profiler()
+    profiler.start(interval_ms, reset)
+    return profiler.status()
+
+@router.post("/debug/profiler/stop", response_model=Dict[str, Any])
+def profiler_stop_api():
+    require_profiler()
+    profiler.stop()
+    return profiler.status()
+
+@router.get("/debug/profiler/folded", response_class=PlainTextResponse)
+def profiler_folded_api(limit: int = Query(0, ge=0)):
+    # flamegraph.pl / speedscope: curl .../folded > perfil.folded
+    require_profiler()
+    return PlainTextResponse(profiler.folded(limit))
@@ -0,0 +1,134 @@
+import logging
+import os
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+from typing import Any, Dict
+from app import inference
+from app.config import settings
+from app.executors import run_io
+from app.models import ModelLoad
+from app.repository.aio import model_deployments
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Los endpoints no cargan modelos: escriben el estado deseado en
+# model_deployments y cada worker (o cada proceso del servidor de inferencia)
+# lo aplica en su registro con inference.sync_models
+
+async def current_deployments() -> Dict[str, Dict[str, Any]]:
+    rows = await model_deployments.list_model_deployments()
+    by_version = {row["version"]: row for row in rows}
+    if inference.desired_active(rows) is None and settings.MODEL_VERSION not in by_version:
+        # MODEL_NAME todavía no está en la tabla: se registra con el primer cambio
+        # (sin updated_at) para poder volver a activarlo después
+        by_version[settings.MODEL_VERSION] = {
+            "version": settings.MODEL_VERSION, "path": inference.MODEL_PATH,
+            "backend": settings.INFERENCE_BACKEND, "state": "active", "shadow_fraction": 0.0,
+        }
+    return by_version
+
+def get_deployment(deployments: Dict[str, Dict[str, Any]], version: str) -> Dict[str, Any]:
+    if version not in deployments:
+        raise HTTPException(status_code=404, detail="model version not found")
+    return deployments[version]
+
+def retire_active(deployments: Dict[str, Dict[str, Any]], changes: Dict[str, Dict[str, Any]]):
+    for row in deployments.values():
+        if row["state"] == "active":
+            changes[row["version"]] = {**row, "state": "retired", "shadow_fraction": 0.0}
+
+def stop_shadows(deployments: Dict[str, Dict[str, Any]], changes: Dict[str, Dict[str, Any]]):
+    for row in deployments.values():
+        if row["shadow_fraction"] > 0:
+            changes[row["version"]] = {**changes.get(row["version"], row), "shadow_fraction": 0.0}
+
+async def models_status() -> Dict[str, Any]:
+    rows = await model_deployments.list_model_deployments()
+    # En modo remote status viene de uno de los workers del servidor de inferencia
+    status = await run_io(inference.models_status)
+    return {"active_version": inference.active_version(), "deployments": rows, **status}
+
+async def save_deployments(deployments: Dict[str, Dict[str, Any]], changes: Dict[str, Dict[str, Any]]):
+    now = datetime.now().isoformat()
+    pending = [row for row in deployments.values() if "updated_at" not in row]
+    rows = [{**row, "updated_at": now} for row in pending + list(changes.values())]
+    await model_deployments.save_model_deployments(list({row["version"]: row for row in rows}.values()))
+    if settings.INFERENCE_MODE == "remote":
+        return
+    # Este worker aplica el cambio ya; los demás en su próximo ciclo (MODEL_SYNC_SECONDS).
+    # El modelo activo se registra antes: si falla se sigue (queda en /health/ready)
+    try:
+        await run_io(inference.load_model)
+    except Exception:
+        logger.exception("Active model failed to load")
+    await run_io(inference.sync_models)
+
+@router.get("/models", response_model=Dict[str, Any])
+async def list_models_api():
+    return await models_status()
+
+@router.post("/models/load", response_model=Dict[str, Any])
+async def load_model_api(request: ModelLoad):
+    path = os.path.join(inference.AI_FOLDER, os.path.basename(request.model_name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"{path} not found")
+    deployments = await current_deployments()
+    current = deployments.get(request.version)
+    if current is not None and current["state"] != "retired":
+        raise HTTPException(status_code=409, detail=f"La versión {request.version} ya está cargada ({current['state']})")
+    changes: Dict[str, Dict[str, Any]] = {}
+    row = {"version": request.version, "path": path, "backend": request.backend,
+           "state": "standby", "shadow_fraction": 0.0}
+    if request.activate:
+        retire_active(deployments, changes)
+        row["state"] = "active"
+    elif request.shadow_fraction > 0:
+        stop_shadows(deployments, changes)
+        row["shadow_fraction"] = request.shadow_fraction
+    changes[request.version] = row
+    await save_deployments(deployments, changes)
+    return JSONResponse(status_code=202, content={"status": "loading", "version": request.version, "path": path})
+
+@router.post("/models/{version}/activate", response_model=Dict[str, Any])
+async def activate_model_api(version: str):
+    deployments = await current_deployments()
+    row = get_deployment(deployments, version)
+    changes: Dict[str, Dict[str, Any]] = {}
+    retire_active(deployments, changes)
+    # Cada worker la activa apenas la tiene cargada (una versión retirada se vuelve a cargar)
+    changes[version] = {**row, "state": "active", "shadow_fraction": 0.0}
+    await save_deployments(deployments, changes)
+    return await models_status()
+
+@router.post("/models/{version}/shadow", response_model=Dict[str, Any])
+async def shadow_model_api(version: str, fraction: float = Query(0.1, ge=0.0, le=1.0)):
+    deployments = await current_deployments()
+    row = get_deployment(deployments, version)
+    if row["state"] == "active":
+        raise HTTPException(status_code=409, detail=f"La versión {version} está activa: no puede evaluarse en sombra")
+    changes: Dict[str, Dict[str, Any]] = {}
+    stop_shadows(deployments, changes)
+    changes[version] = {**row, "state": "standby", "shadow_fraction": fraction}
+    await save_deployments(deployments, changes)
+    return await models_status()
+
+@router.delete("/models/shadow", response_model=Dict[str, Any])
+async def stop_shadow_api():
+    deployments = await current_deployments()
+    changes: Dict[str, Dict[str, Any]] = {}
+    stop_shadows(deployments, changes)
+    if changes:
+        await save_deployments(deployments, changes)
+    return await models_status()
+
+@router.delete("/models/{version}", response_model=Dict[str, Any])
+async def unload_model_api(version: str):
+    deployments = await current_deployments()
+    row = get_deployment(deployments, version)
+    if row["state"] == "active":
+        raise HTTPException(status_code=409, detail=f"La versión {version} está activa: activar otra antes de descargarla")
+    await save_deployments(deployments, {version: {**row, "state": "retired", "shadow_fraction": 0.0}})
+    return await models_status()
@@ -12,16 +12,23 @@ def list_users_api(
     page: int = 1,
     order_by: str = "id",
     order_dir: str = "ASC",
-    filters: Optional[Dict[str, str]] = None
+    filters: Optional[Dict[str, str]] = None,
+    cursor: Optional[str] = None,
+    include_count: bool = True
 ):
-    return user_repository.list_users(
-        fields=fields,
-        filters=filters or {},
-        order_by=order_by,
-        order_dir=order_dir,
-        limit=limit,
-        page=page
-    )
+    try:
+        return user_repository.list_users(
+            fields=fields,
+            filters=filters or {},
+            order_by=order_by,
+            order_dir=order_dir,
+            limit=limit,
+            page=page,
+            cursor=cursor,
+            include_count=include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @users.get("/users/{user_id}", response_model=User)
 def get_user_api(user_id: int = Path(...)):
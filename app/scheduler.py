@@ -0,0 +1,165 @@
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.metrics import create_background_task
+
+# Limites (en ms) de los histogramas de espera e inferencia
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500]
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{b}" for b in self.buckets] + ["le_inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+        }
+
+
+class InferenceScheduler:
+    """Agrupa tensores de peticiones concurrentes en un solo forward pass.
+
+    Un lote se despacha al llegar a ``max_batch_size`` elementos o cuando el
+    elemento más antiguo lleva ``max_wait_ms`` en la cola. ``predict_fn``
+    devuelve las probabilidades del lote o ``(versión, probabilidades)``.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], Any],
+                 max_batch_size: int = 32, max_wait_ms: float = 10.0,
+                 executor: Executor | None = None, concurrency: int = 1):
+        self.predict_fn = predict_fn
+        self.executor = executor
+        self.concurrency = max(1, concurrency)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._versions: Counter = Counter()
+        self._wait_ms = _Histogram(LATENCY_BUCKETS_MS)
+        self._inference_ms = _Histogram(LATENCY_BUCKETS_MS)
+        self._items = 0
+        self._errors = 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._worker = create_background_task(self._run(), loop)
+
+    async def predict_versioned(self, tensor: np.ndarray) -> Tuple[float, str | None]:
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((tensor, future, time.perf_counter()))
+        return await future
+
+    async def predict(self, tensor: np.ndarray) -> float:
+        return (await self.predict_versioned(tensor))[0]
+
+    async def predict_many_versioned(self, tensors: Sequence[np.ndarray]) -> List[Tuple[float, str | None]]:
+        return list(await asyncio.gather(*(self.predict_versioned(t) for t in tensors)))
+
+    async def predict_many(self, tensors: Sequence[np.ndarray]) -> List[float]:
+        return [prob for prob, _ in await self.predict_many_versioned(tensors)]
+
+    async def _run(self):
+        while True:
+            # Con concurrency > 1 (p.ej. servidor de inferencia con varios
+            # procesos) se despachan varios lotes a la vez
+            await self._slots.acquire()
+            items = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait - (time.perf_counter() - items[0][2])
+            while len(items) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = self._loop.create_task(self._flush(items))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _flush(self, items):
+        try:
+            await self._dispatch(items)
+        finally:
+            self._slots.release()
+
+    async def _dispatch(self, items):
+        started = time.perf_counter()
+        try:
+            batch = np.stack([tensor for tensor, _, _ in items])
+            # El forward pass corre fuera del event loop para seguir encolando
+            result = await self._loop.run_in_executor(self.executor, self.predict_fn, batch)
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        version, preds = result if isinstance(result, tuple) else (None, result)
+        finished = time.perf_counter()
+        with self._lock:
+            self._batch_sizes[len(items)] += 1
+            self._versions[version] += len(items)
+            self._items += len(items)
+            self._inference_ms.observe((finished - started) * 1000)
+            for _, _, enqueued in items:
+                self._wait_ms.observe((started - enqueued) * 1000)
+        for (_, future, _), pred in zip(items, preds):
+            if not future.done():
+                future.set_result((float(pred), version))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "concurrency": self.concurrency,
+                "queue_depth": self._queue.qsize() if self._queue else 0,
+                "batches": batches,
+                "items": self._items,
+                "errors": self._errors,
+                "avg_batch_size": round(self._items / batches, 3) if batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                # Imágenes por versión del modelo (se ve el corte al cambiar de versión)
+                "items_by_model_version": {str(k): v for k, v in self._versions.items()},
+                "wait_ms": self._wait_ms.snapshot(),
+                "inference_ms": self._inference_ms.snapshot(),
+            }
@@ -0,0 +1,175 @@
+"""Prueba de carga: latencia de los GET mientras se suben imágenes.
+
+    python -m benchmarks.db_load --duration 10 --readers 16 --uploaders 4
+
+Levanta la app en proceso (httpx + ASGITransport) sobre una base temporal con
+datos sembrados y mide p50/p95/p99 de los endpoints de lectura, primero solos
+y luego con subidas concurrentes. El modelo se reemplaza por una función que
+tarda ``--inference-ms``, así la prueba mide la API y SQLite, no TensorFlow.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir.name, "load.db")
+os.chdir(_tmpdir.name)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from app import database as db  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.routers import image_files  # noqa: E402
+
+API = "/api/v1"
+
+
+def _seed(rows: int):
+    images = db.create_many("image_files", [{
+        "name": f"seed_{i}.png", "size": 1, "type": "image/png", "last_modified": 0,
+        "url": f"uploads/seed_{i}.png", "uploaded_at": f"2025-01-{i % 28 + 1:02d}T00:00:00",
+        "status": "uploaded",
+    } for i in range(rows)])
+    db.create_many("analysis_results", [{
+        "image_id": image["id"], "pcos_probability": 0.5, "confidence": 0.8,
+        "analyzed_at": image["uploaded_at"], "status": "completed",
+    } for image in images])
+    return [image["id"] for image in images]
+
+
+def _fake_predict(delay: float):
+    def predict(batch):
+        time.sleep(delay)
+        return settings.MODEL_VERSION, np.full(len(batch), 0.5, dtype=np.float32)
+    return predict
+
+
+def _random_png(rng: np.random.Generator, size: int) -> bytes:
+    # Contenido distinto en cada subida para no caer en la deduplicación
+    ok, buf = cv2.imencode(".png", rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+    return buf.tobytes()
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.50), 2),
+        "p95_ms": round(pick(0.95), 2),
+        "p99_ms": round(pick(0.99), 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+async def _reader(client, ids, stop, latencies):
+    rnd = random.Random()
+    while not stop.is_set():
+        kind = rnd.choice(("image_file", "analysis_list", "analysis_wait"))
+        if kind == "image_file":
+            url = f"{API}/image_files/{rnd.choice(ids)}"
+        elif kind == "analysis_list":
+            url = f"{API}/analysis_results?limit=10&include_count=false&order_by=analyzed_at"
+        else:
+            url = f"{API}/analysis_results/{rnd.choice(ids)}/wait?timeout=0"
+        started = time.perf_counter()
+        r = await client.get(url)
+        latencies.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+        if r.status_code != 200:
+            raise RuntimeError(f"GET {url}: {r.status_code} {r.text}")
+
+
+async def _uploader(client, args, seed, stop, counters):
+    rng = np.random.default_rng(seed)
+    while not stop.is_set():
+        files = [("files", (f"load_{seed}_{i}.png", _random_png(rng, args.image_size), "image/png"))
+                 for i in range(args.files_per_upload)]
+        r = await client.post(f"{API}/image_files/upload", files=files,
+                              params={"background": str(args.background).lower()})
+        if r.status_code != 200:
+            raise RuntimeError(f"upload: {r.status_code} {r.text}")
+        counters["uploads"] += 1
+        counters["files"] += len(files)
+
+
+async def _phase(client, args, ids, uploaders: int):
+    stop = asyncio.Event()
+    latencies = {}
+    counters = {"uploads": 0, "files": 0}
+    tasks = [asyncio.create_task(_reader(client, ids, stop, latencies)) for _ in range(args.readers)]
+    tasks += [asyncio.create_task(_uploader(client, args, i, stop, counters)) for i in range(uploaders)]
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    result = {
+        "uploaders": uploaders,
+        "uploads_per_s": round(counters["uploads"] / args.duration, 2),
+        "files_per_s": round(counters["files"] / args.duration, 2),
+        "get_all": _percentiles([v for values in latencies.values() for v in values]),
+    }
+    for kind, values in sorted(latencies.items()):
+        result[f"get_{kind}"] = _percentiles(values)
+    return result
+
+
+async def run(args):
+    db.ensure_db()
+    ids = _seed(args.rows)
+    image_files.scheduler.predict_fn = _fake_predict(args.inference_ms / 1000)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        baseline = await _phase(client, args, ids, uploaders=0)
+        loaded = await _phase(client, args, ids, uploaders=args.uploaders)
+        # Deja terminar los análisis en segundo plano antes de cerrar
+        while image_files.analysis_jobs.stats()["queued"]:
+            await asyncio.sleep(0.05)
+    return {"config": vars(args), "baseline": baseline, "with_uploads": loaded}
+
+
+def _print(report):
+    for name in ("baseline", "with_uploads"):
+        phase = report[name]
+        print(f"{name}: {phase['uploaders']} uploaders, {phase['files_per_s']} files/s")
+        for key, stats in phase.items():
+            if key.startswith("get_") and stats["count"]:
+                print(f"  {key:<20} n={stats['count']:<6} p50={stats['p50_ms']:>8} ms "
+                      f"p95={stats['p95_ms']:>8} ms p99={stats['p99_ms']:>8} ms")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos por fase")
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--uploaders", type=int, default=4)
+    parser.add_argument("--files-per-upload", type=int, default=4)
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--rows", type=int, default=5000, help="filas sembradas por tabla")
+    parser.add_argument("--inference-ms", type=float, default=20.0)
+    parser.add_argument("--background", action="store_true", help="subidas con ?background=true")
+    parser.add_argument("--json", action="store_true", help="salida en JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        db.close_connections()
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        _print(report)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,92 @@
+"""Microbenchmark: ruta de preprocesamiento original vs app.preprocessing.
+
+    python -m benchmarks.preprocessing [imagenes...] --repeat 50
+
+La ruta original decodifica con PIL (como keras image.load_img), crea un
+CLAHE por canal y pasa por float/uint8 varias veces. Verifica además que
+ambas rutas producen el mismo tensor, también con un JPEG con orientación EXIF.
+"""
+import argparse
+import io
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app import preprocessing
+
+TOLERANCE = 1e-3
+
+
+def legacy_apply_clahe(image_array):
+    if image_array.dtype != np.uint8:
+        image_array = (image_array * 255).astype(np.uint8)
+    clahe_img = np.zeros_like(image_array)
+    for i in range(image_array.shape[2]):
+        clahe = cv2.createCLAHE(clipLimit=0.03, tileGridSize=(8,8))
+        clahe_img[:,:,i] = clahe.apply(image_array[:,:,i])
+    return clahe_img / 255.0
+
+
+def legacy_preprocess(data: bytes) -> np.ndarray:
+    size = preprocessing.IMG_SIZE
+    img = Image.open(io.BytesIO(data)).convert("RGB").resize((size, size), Image.NEAREST)
+    x = np.asarray(img, dtype=np.float32)
+    return preprocessing.vgg19_preprocess_input(legacy_apply_clahe(x) * 255.0)
+
+
+def exif_rotated(data: bytes, orientation: int = 6) -> bytes:
+    # JPEG con orientación EXIF: la ruta original (PIL) la ignoraba, la nueva también debe
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buf = io.BytesIO()
+    Image.open(io.BytesIO(data)).convert("RGB").save(buf, format="JPEG", exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def bench(fn, images, repeat):
+    fn(images[0])
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for data in images:
+            fn(data)
+    return (time.perf_counter() - started) / (repeat * len(images)) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", default=["test_image.jpg"])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with np.errstate(all="ignore"):
+        images = [open(path, "rb").read() for path in args.images]
+
+        max_diff = 0.0
+        for data in images + [exif_rotated(images[0])]:
+            diff = np.abs(legacy_preprocess(data) - preprocessing.preprocess_image(data)).max()
+            max_diff = max(max_diff, float(diff))
+
+        legacy_ms = bench(legacy_preprocess, images, args.repeat)
+        fast_ms = bench(preprocessing.preprocess_image, images, args.repeat)
+        started = time.perf_counter()
+        out = np.empty((len(images), preprocessing.IMG_SIZE, preprocessing.IMG_SIZE, 3), dtype=np.float32)
+        for _ in range(args.repeat):
+            preprocessing.preprocess_batch(images, out=out)
+        batch_ms = (time.perf_counter() - started) / (args.repeat * len(images)) * 1000
+
+    print(f"images: {len(images)}  repeat: {args.repeat}")
+    print(f"legacy path:      {legacy_ms:8.3f} ms/img")
+    print(f"preprocessing:    {fast_ms:8.3f} ms/img  ({legacy_ms / fast_ms:.2f}x)")
+    print(f"preprocess_batch: {batch_ms:8.3f} ms/img  ({legacy_ms / batch_ms:.2f}x)")
+    print(f"max abs diff:     {max_diff:.6f}")
+    if max_diff > TOLERANCE:
+        print(f"FAIL: outputs differ by more than {TOLERANCE}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Tiempo de arranque de la API, en un proceso nuevo por corrida.
+
+    python -m benchmarks.startup --runs 5 --max-seconds 3
+
+Mide cuánto tarda ``import main`` y el lifespan de arranque (migraciones,
+reencolado de trabajos), la memoria máxima del proceso y si se importó
+TensorFlow/Keras. Termina con código 1 si la mediana supera ``--max-seconds``
+o si el arranque cargó el framework del modelo, para detectar regresiones.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["tensorflow", "keras", "torch", "onnxruntime"]
+
+# Corre en el proceso hijo: imprime una línea JSON con las mediciones
+CHILD = """
+import asyncio, json, resource, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+async def boot():
+    async with main.lifespan(main.app):
+        pass
+asyncio.run(boot())
+ready = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - started,
+    "startup_s": ready - imported,
+    "total_s": ready - started,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once(env) -> dict:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = {**env, "DATABASE_PATH": os.path.join(tmpdir, "startup.db"),
+               "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))}
+        # cwd temporal: uploads/ y derivatives/ no se crean en el repositorio
+        out = subprocess.run([sys.executable, "-c", CHILD], cwd=tmpdir, env=env,
+                             capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="falla si la mediana de total_s lo supera")
+    parser.add_argument("--json", action="store_true", help="salida en JSON")
+    args = parser.parse_args(argv)
+
+    # Sin warm-up: se mide el arranque que no debe tocar el modelo
+    env = {**os.environ, "MODEL_WARMUP": "false"}
+    runs = [run_once(env) for _ in range(max(1, args.runs))]
+    report = {
+        key: round(statistics.median(r[key] for r in runs), 4)
+        for key in ("import_s", "startup_s", "total_s", "max_rss_mb")
+    }
+    report["heavy_modules"] = sorted({m for r in runs for m in r["heavy_modules"]})
+    report["runs"] = len(runs)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"median over {len(runs)} runs")
+        for key in ("import_s", "startup_s", "total_s"):
+            print(f"  {key:<10} {report[key]:.3f} s")
+        print(f"  max_rss    {report['max_rss_mb']:.1f} MB")
+        print(f"  heavy modules imported: {', '.join(report['heavy_modules']) or 'none'}")
+
+    failed = bool(report["heavy_modules"])
+    if args.max_seconds is not None and report["total_s"] > args.max_seconds:
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,430 @@
+"""Suite de benchmarks reproducible, con resultados en JSON para comparar commits.
+
+    python -m benchmarks.suite --output base.json
+    python -m benchmarks.suite --quick --compare base.json --max-regression 0.2
+
+Secciones (``--sections``, por defecto todas):
+
+    preprocessing  enhanced_preprocessing (ruta float original), preprocess_into
+                   y preprocess_image (bytes -> tensor)
+    inference      modelo con lotes de 1, 8 y 32 (a través del registro)
+    list_all       database.list_all sobre 10k y 1M filas: primera página, conteo,
+                   OFFSET profundo y la misma página con cursor
+    create_many    inserciones de 20k filas en lotes de 1 a 10000
+    upload         POST /image_files/upload concurrente (httpx + ASGITransport)
+
+No necesita los pesos reales: el modelo es el backend ``stub`` de este módulo,
+una proyección lineal fija con costo de CPU proporcional al lote y resultado
+determinista. ``--model ai/modelo.onnx`` mide un modelo real.
+
+Cada caso reporta la mediana en ms (la métrica que se compara), p95, p99,
+mínimo y el número de muestras. ``--compare`` termina con código 1 si alguna
+mediana empeora más de ``--max-regression`` respecto de la corrida base (y
+más de ``--min-delta-ms``, para no fallar por ruido en casos de microsegundos).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CWD = os.getcwd()
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir.name, "suite.db")
+# El modelo corre en este proceso (registro local), sin warm-up al importar
+os.environ["INFERENCE_MODE"] = "local"
+os.environ["MODEL_WARMUP"] = "false"
+# cwd temporal: uploads/ y derivatives/ no se crean en el repositorio
+os.chdir(_tmpdir.name)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from app import database as db, inference, preprocessing  # noqa: E402
+from app.backends import BACKENDS, InferenceBackend  # noqa: E402
+from app.config import settings  # noqa: E402
+
+API = "/api/v1"
+SECTIONS = ["preprocessing", "inference", "list_all", "create_many", "upload"]
+PAGE_SIZE = 50
+
+
+class StubBackend(InferenceBackend):
+    """Proyección lineal fija + sigmoide: sin TensorFlow ni pesos del modelo."""
+
+    name = "stub"
+    FEATURES = 64
+
+    def __init__(self, path: str, threads: int = 0):
+        super().__init__(path, threads)
+        rng = np.random.default_rng(0)
+        size = preprocessing.IMG_SIZE
+        self.weights = rng.standard_normal((size * size * 3, self.FEATURES), dtype=np.float32) / size
+        self.head = rng.standard_normal(self.FEATURES, dtype=np.float32)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        features = np.tanh(np.reshape(batch, (len(batch), -1)) @ self.weights / 100)
+        return (1 / (1 + np.exp(-(features @ self.head) / self.FEATURES))).astype(np.float32)
+
+
+BACKENDS[StubBackend.name] = StubBackend
+
+
+# --- medición ---
+
+def _summary(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return {
+        "n": len(ordered),
+        "median_ms": round(statistics.median(ordered), 4),
+        "p95_ms": round(pick(0.95), 4),
+        "p99_ms": round(pick(0.99), 4),
+        "min_ms": round(ordered[0], 4),
+    }
+
+
+def _measure(fn, repeat: int, warmup: int = 1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return _summary(samples)
+
+
+def _case(results, name, summary, **extra):
+    results.append({"name": name, **summary, **extra})
+    print(f"  {name:<58} {summary['median_ms']:>10.3f} ms", file=sys.stderr)
+
+
+def _use_database(name: str):
+    # Base nueva por caso: el tamaño de la anterior no influye en la medición
+    db.close_connections()
+    settings.DATABASE_PATH = os.path.join(_tmpdir.name, name)
+    db.ensure_db()
+
+
+def _image_rows(start: int, stop: int):
+    return [{
+        "name": f"scan_{i}.png", "size": 1, "type": "image/png", "last_modified": 0,
+        "url": f"uploads/scan_{i}.png",
+        "uploaded_at": datetime.fromtimestamp(1_735_689_600 + i, timezone.utc).isoformat(),
+        "status": "error" if i % 10 == 0 else "uploaded",
+    } for i in range(start, stop)]
+
+
+# --- secciones ---
+
+def bench_preprocessing(args, results):
+    data = np.fromfile(args.image, dtype=np.uint8)
+    decoded = preprocessing.decode_image(data)
+    # La ruta original recibe RGB float 0-255 (keras img_to_array)
+    rgb = cv2.cvtColor(decoded, cv2.COLOR_BGR2RGB).astype(np.float32)
+    out = np.empty((preprocessing.IMG_SIZE, preprocessing.IMG_SIZE, 3), dtype=np.float32)
+    with np.errstate(all="ignore"):
+        _case(results, "preprocessing/enhanced_preprocessing",
+              _measure(lambda: preprocessing.enhanced_preprocessing(rgb), args.repeat))
+    _case(results, "preprocessing/preprocess_into",
+          _measure(lambda: preprocessing.preprocess_into(decoded, out), args.repeat))
+    _case(results, "preprocessing/preprocess_image",
+          _measure(lambda: preprocessing.preprocess_image(data), args.repeat), image_bytes=len(data))
+
+
+def bench_inference(args, results):
+    image = preprocessing.preprocess_image(np.fromfile(args.image, dtype=np.uint8))
+    batch = np.ascontiguousarray(np.broadcast_to(image, (max(args.batch_sizes), *image.shape)))
+    for size in args.batch_sizes:
+        summary = _measure(lambda: inference.registry.predict(batch[:size]), args.repeat)
+        _case(results, f"inference/batch={size}", summary,
+              per_image_ms=round(summary["median_ms"] / size, 4),
+              images_per_s=round(size * 1000 / summary["median_ms"], 1))
+
+
+def _anchor_cursor(order_by, order_dir, filters, offset):
+    # Cursor de la fila anterior a ``offset``: la página con cursor empieza en el mismo punto
+    row = db.list_all("image_files", ["id", order_by], filters, order_by, order_dir,
+                      limit=1, page=offset, include_count=False).data[0]
+    return db.encode_cursor(order_by, row[order_by], row["id"])
+
+
+def bench_list_all(args, results):
+    orders = [("id", "ASC", {}), ("uploaded_at", "DESC", {"status": "uploaded"})]
+    for rows in args.rows:
+        _use_database(f"list_{rows}.db")
+        started = time.perf_counter()
+        for start in range(0, rows, args.seed_chunk):
+            db.create_many("image_files", _image_rows(start, min(rows, start + args.seed_chunk)))
+        print(f"  seeded {rows} rows in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+        def count():
+            # Sin el caché de conteos: se mide el COUNT(*) completo
+            db._invalidate_counts("image_files")
+            db.list_all("image_files", ["*"], {}, "id", "ASC", PAGE_SIZE, 1, include_count=True)
+
+        _case(results, f"list_all/rows={rows}/count", _measure(count, args.db_repeat))
+        for order_by, order_dir, filters in orders:
+            prefix = f"list_all/rows={rows}/{order_by}_{order_dir.lower()}"
+            matching = rows - (rows + 9) // 10 if filters else rows
+            _case(results, f"{prefix}/first_page", _measure(
+                lambda: db.list_all("image_files", ["*"], filters, order_by, order_dir, PAGE_SIZE, 1,
+                                    include_count=False), args.db_repeat))
+            for depth, page in (("mid", matching // 2 // PAGE_SIZE), ("last", -(-matching // PAGE_SIZE))):
+                page = max(page, 2)
+                cursor = _anchor_cursor(order_by, order_dir, filters, (page - 1) * PAGE_SIZE)
+                by_offset = lambda: db.list_all("image_files", ["*"], filters, order_by, order_dir,  # noqa: E731
+                                                PAGE_SIZE, page, include_count=False)
+                by_cursor = lambda: db.list_all("image_files", ["*"], filters, order_by, order_dir,  # noqa: E731
+                                                PAGE_SIZE, cursor=cursor, include_count=False)
+                if [r["id"] for r in by_offset().data] != [r["id"] for r in by_cursor().data]:
+                    raise RuntimeError(f"{prefix}: la página {page} con OFFSET y con cursor no coinciden")
+                _case(results, f"{prefix}/offset_{depth}", _measure(by_offset, args.db_repeat),
+                      offset=(page - 1) * PAGE_SIZE)
+                _case(results, f"{prefix}/cursor_{depth}", _measure(by_cursor, args.db_repeat),
+                      offset=(page - 1) * PAGE_SIZE)
+
+
+def bench_create_many(args, results):
+    for size in args.bulk_sizes:
+        _use_database(f"insert_{size}.db")
+        calls = max(1, args.insert_rows // size)
+        batches = [_image_rows(i * size, (i + 1) * size) for i in range(calls)]
+        samples = []
+        started = time.perf_counter()
+        for batch in batches:
+            t = time.perf_counter()
+            db.create_many("image_files", batch)
+            samples.append((time.perf_counter() - t) * 1000)
+        elapsed = time.perf_counter() - started
+        _case(results, f"create_many/bulk={size}", _summary(samples),
+              rows=calls * size, rows_per_s=round(calls * size / elapsed, 1))
+
+
+def _upload_images(base: np.ndarray, count: int, offset: int):
+    # Contenido distinto en cada subida para no caer en la deduplicación (el
+    # número se dibuja: un cambio de un píxel lo borra la compresión JPEG)
+    images = []
+    for i in range(offset, offset + count):
+        img = cv2.putText(base.copy(), str(i), (8, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+        images.append(cv2.imencode(".jpg", img)[1].tobytes())
+    return images
+
+
+def _server_timing(header: str):
+    stages = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key == "dur":
+                stages[name] = float(value)
+    return stages
+
+
+async def _upload_level(client, images, concurrency, files_per_upload):
+    pending = [images[i:i + files_per_upload] for i in range(0, len(images), files_per_upload)]
+    pending.reverse()
+    latencies, stages = [], {}
+
+    async def worker():
+        while pending:
+            batch = pending.pop()
+            files = [("files", (f"bench_{i}.jpg", data, "image/jpeg")) for i, data in enumerate(batch)]
+            started = time.perf_counter()
+            r = await client.post(f"{API}/image_files/upload", files=files)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if r.status_code != 200:
+                raise RuntimeError(f"upload: {r.status_code} {r.text}")
+            for name, ms in _server_timing(r.headers.get("server-timing", "")).items():
+                stages.setdefault(name, []).append(ms)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return latencies, elapsed, stages
+
+
+async def _run_uploads(args, results):
+    base = cv2.resize(cv2.imread(args.image), (args.image_size, args.image_size))
+    transport = httpx.ASGITransport(app=main.app)
+    offset = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # Primera subida fuera de la medición: crea el scheduler y los hilos
+        await _upload_level(client, _upload_images(base, 1, offset), 1, 1)
+        offset += 1
+        for concurrency in args.concurrency:
+            count = args.upload_requests * args.files_per_upload
+            images = _upload_images(base, count, offset)
+            offset += count
+            latencies, elapsed, stages = await _upload_level(client, images, concurrency, args.files_per_upload)
+            _case(results, f"upload/concurrency={concurrency}", _summary(latencies),
+                  requests_per_s=round(len(latencies) / elapsed, 2),
+                  files_per_s=round(count / elapsed, 2),
+                  stages_median_ms={name: round(statistics.median(v), 3) for name, v in sorted(stages.items())})
+
+
+def bench_upload(args, results):
+    _use_database("upload.db")
+    asyncio.run(_run_uploads(args, results))
+
+
+BENCHES = {
+    "preprocessing": bench_preprocessing,
+    "inference": bench_inference,
+    "list_all": bench_list_all,
+    "create_many": bench_create_many,
+    "upload": bench_upload,
+}
+
+
+# --- reporte y comparación ---
+
+def _git(*cmd):
+    try:
+        return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment(args):
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "model": args.model or StubBackend.name,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "json")},
+    }
+
+
+def compare(report, baseline, max_regression: float, min_delta_ms: float):
+    previous = {case["name"]: case for case in baseline["results"]}
+    cases, regressions = [], []
+    for case in report["results"]:
+        old = previous.get(case["name"])
+        if old is None or not old["median_ms"]:
+            continue
+        ratio = case["median_ms"] / old["median_ms"]
+        regressed = ratio > 1 + max_regression and case["median_ms"] - old["median_ms"] > min_delta_ms
+        cases.append({"name": case["name"], "baseline_ms": old["median_ms"],
+                      "median_ms": case["median_ms"], "ratio": round(ratio, 3), "regressed": regressed})
+        if regressed:
+            regressions.append(case["name"])
+    return {
+        "baseline_commit": baseline.get("environment", {}).get("commit"),
+        "max_regression": max_regression,
+        "cases": cases,
+        "regressions": regressions,
+    }
+
+
+def _print(report):
+    env = report["environment"]
+    print(f"commit {env['commit'] or '?'}{' (dirty)' if env['dirty'] else ''}, model {env['model']}")
+    for case in report["results"]:
+        print(f"  {case['name']:<58} median={case['median_ms']:>10.3f} ms "
+              f"p95={case['p95_ms']:>10.3f} ms n={case['n']}")
+    comparison = report.get("comparison")
+    if comparison:
+        print(f"vs {comparison['baseline_commit'] or 'baseline'} (max regression {comparison['max_regression']:.0%})")
+        for case in comparison["cases"]:
+            flag = "  REGRESSION" if case["regressed"] else ""
+            print(f"  {case['name']:<58} {case['baseline_ms']:>10.3f} -> {case['median_ms']:>10.3f} ms "
+                  f"x{case['ratio']:.2f}{flag}")
+
+
+def _ints(value: str):
+    return [int(x) for x in value.split(",") if x.strip()]
+
+
+def _path(value: str):
+    # Rutas relativas al directorio desde el que se lanzó la suite (el proceso cambia de cwd)
+    return os.path.join(_CWD, value)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", default=",".join(SECTIONS), help=f"de: {', '.join(SECTIONS)}")
+    parser.add_argument("--quick", action="store_true",
+                        help="menos repeticiones y 10k/100k filas (para CI)")
+    parser.add_argument("--image", type=_path, default=os.path.join(ROOT, "test_image.jpg"))
+    parser.add_argument("--model", type=_path, default=None, help="modelo real en vez del stub")
+    parser.add_argument("--backend", default="auto")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=None, help="muestras por caso de CPU")
+    parser.add_argument("--db-repeat", type=int, default=None, help="muestras por consulta")
+    parser.add_argument("--batch-sizes", type=_ints, default=[1, 8, 32])
+    parser.add_argument("--rows", type=_ints, default=None, help="filas de list_all (por defecto 10000,1000000)")
+    parser.add_argument("--seed-chunk", type=int, default=10000)
+    parser.add_argument("--bulk-sizes", type=_ints, default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--insert-rows", type=int, default=None, help="filas por tamaño de lote")
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8, 32])
+    parser.add_argument("--upload-requests", type=int, default=None, help="subidas por nivel de concurrencia")
+    parser.add_argument("--files-per-upload", type=int, default=1)
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--output", type=_path, help="escribe el reporte JSON en este archivo")
+    parser.add_argument("--compare", type=_path, help="reporte JSON de la corrida base")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=0.05)
+    parser.add_argument("--json", action="store_true", help="salida en JSON")
+    args = parser.parse_args(argv)
+
+    quick = args.quick
+    args.sections = [s for s in args.sections.split(",") if s]
+    unknown = set(args.sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"secciones desconocidas: {', '.join(sorted(unknown))}")
+    args.repeat = args.repeat or (20 if quick else 100)
+    args.db_repeat = args.db_repeat or (5 if quick else 20)
+    args.rows = args.rows or ([10_000, 100_000] if quick else [10_000, 1_000_000])
+    args.insert_rows = args.insert_rows or (2_000 if quick else 20_000)
+    args.upload_requests = args.upload_requests or (16 if quick else 64)
+
+    if {"inference", "upload"} & set(args.sections):
+        path, backend = (args.model, args.backend) if args.model else (StubBackend.name, StubBackend.name)
+        entry = inference.registry.load(settings.MODEL_VERSION, path, backend, args.threads)
+        inference.registry.activate(entry.version)
+
+    results = []
+    try:
+        for section in args.sections:
+            print(f"{section}:", file=sys.stderr)
+            BENCHES[section](args, results)
+    finally:
+        db.close_connections()
+
+    report = {"environment": _environment(args), "results": results}
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f), args.max_regression, args.min_delta_ms)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        _print(report)
+    return 1 if report.get("comparison", {}).get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,15 +1,43 @@
-from fastapi import FastAPI
+import asyncio
+import sqlite3
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers.users import users  
-from app.routers.image_files import router as image_files  
+from app.routers.image_files import router as image_files, recover_jobs, resume_pending_analyses, resume_pending_derivatives
 from app.routers.analysis_results import router as anylisis  
+from app.routers.health import router as health, warm_up_model
+from app.routers.models import router as models
+from app.routers.metrics import router as metrics_router
+from app.metrics import MetricsMiddleware, create_background_task
 from app.config import settings
+from app import database, inference
 
 ROUTER_PREFIX = "/api/v1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.INFERENCE_MODE == "remote":
+        # Sin INFERENCE_AUTHKEY la API no arranca en modo remote
+        inference.authkey()
+    database.ensure_db()
+    await resume_pending_analyses()
+    await resume_pending_derivatives()
+    recovery = create_background_task(recover_jobs())
+    # El modelo se carga en el primer uso; con MODEL_WARMUP se precarga sin bloquear el arranque
+    warmup = asyncio.create_task(warm_up_model()) if settings.MODEL_WARMUP else None
+    yield
+    recovery.cancel()
+    if warmup is not None:
+        warmup.cancel()
+    database.close_connections()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API para materia de IA",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -20,6 +48,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Duración por ruta y cabecera Server-Timing (/metrics)
+app.add_middleware(MetricsMiddleware)
+@app.exception_handler(sqlite3.IntegrityError)
+async def integrity_error_handler(request: Request, exc: sqlite3.IntegrityError):
+    # Restricciones NOT NULL / UNIQUE / CHECK: el lote completo se revirtió
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+app.include_router(
+    health,
+    tags=["Salud"]
+)
+
+app.include_router(
+    metrics_router,
+    tags=["Métricas"]
+)
+
 app.include_router(
     users,
     prefix=ROUTER_PREFIX, 
@@ -36,6 +81,11 @@ app.include_router(
     prefix=ROUTER_PREFIX, 
     tags=["Analisis"]     
 )
+app.include_router(
+    models,
+    prefix=ROUTER_PREFIX,
+    tags=["Modelos"]
+)
 
 @app.get("/")
 def root():
@@ -44,5 +94,9 @@ def root():
         "Usuarios":"/api/v1/users",
         "Imagenes":"/api/v1/image_files",
         "Análisis":"/api/v1/analysis_results",
+        "Inferencia":"/api/v1/inference/stats",
+        "Modelos":"/api/v1/models",
+        "Salud":"/health/ready",
+        "Métricas":"/metrics",
     }
 
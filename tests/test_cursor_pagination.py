@@ -0,0 +1,54 @@
+"""Paginación con cursor sobre columnas que admiten NULL.
+
+    python -m pytest tests
+"""
+import pytest
+
+from app import database as db
+from app.config import settings
+
+ROWS = 23
+PAGE = 4
+
+
+@pytest.fixture
+def image_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "cursor.db"))
+    db.ensure_db()
+    # width NULL en una de cada tres filas, con valores repetidos entre las demás
+    db.create_many("image_files", [{
+        "name": f"scan_{i}.png", "size": 1, "type": "image/png", "last_modified": 0,
+        "url": f"uploads/scan_{i}.png", "uploaded_at": f"2025-01-{i % 28 + 1:02d}T00:00:00",
+        "status": "uploaded", "width": None if i % 3 == 0 else i % 5,
+    } for i in range(ROWS)])
+    yield
+    db.close_connections()
+
+
+def _all_ids(order_by, order_dir):
+    page = db.list_all("image_files", ["id"], {}, order_by, order_dir, limit=-1, include_count=False)
+    return [row["id"] for row in page.data]
+
+
+def _cursor_ids(order_by, order_dir):
+    ids, cursor = [], None
+    for _ in range(ROWS):
+        page = db.list_all("image_files", ["id"], {}, order_by, order_dir, limit=PAGE,
+                           cursor=cursor, include_count=False)
+        ids += [row["id"] for row in page.data]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    return ids
+
+
+@pytest.mark.parametrize("order_dir", ["ASC", "DESC"])
+def test_cursor_pages_through_nullable_column(image_files, order_dir):
+    expected = _all_ids("width", order_dir)
+    assert len(expected) == ROWS
+    assert _cursor_ids("width", order_dir) == expected
+
+
+@pytest.mark.parametrize("order_dir", ["ASC", "DESC"])
+def test_cursor_on_not_null_column_unchanged(image_files, order_dir):
+    assert _cursor_ids("uploaded_at", order_dir) == _all_ids("uploaded_at", order_dir)
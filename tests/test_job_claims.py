@@ -0,0 +1,57 @@
+"""Reclamo de análisis y derivados entre varios workers (lease por claimed_at).
+
+    python -m pytest tests
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import database as db
+from app.config import settings
+from app.repository import analysis_results, image_file
+
+NOW = datetime(2025, 1, 10, 12, 0, 0)
+STALE_BEFORE = (NOW - timedelta(minutes=10)).isoformat()
+
+
+@pytest.fixture
+def rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "claims.db"))
+    db.ensure_db()
+    images = db.create_many("image_files", [{
+        "name": f"scan_{i}.png", "size": 1, "type": "image/png", "last_modified": 0,
+        "url": f"uploads/scan_{i}.png", "uploaded_at": NOW.isoformat(), "status": "uploaded",
+        "content_hash": f"{i:064x}",
+    } for i in range(3)])
+    analyses = db.create_many("analysis_results", [{
+        "image_id": image["id"], "pcos_probability": 0.0, "confidence": 0.0,
+        "analyzed_at": NOW.isoformat(), "status": status, "claimed_at": claimed_at,
+    } for image, (status, claimed_at) in zip(images, [
+        ("pending", None),
+        ("processing", (NOW - timedelta(minutes=1)).isoformat()),   # worker vivo
+        ("processing", (NOW - timedelta(hours=1)).isoformat()),     # worker caído
+    ])])
+    yield [row["id"] for row in images], [row["id"] for row in analyses]
+    db.close_connections()
+
+
+def test_pending_analysis_is_claimed_once(rows):
+    _, (pending, _, _) = rows
+    assert analysis_results.claim_analysis_result(pending, NOW.isoformat(), STALE_BEFORE)
+    assert not analysis_results.claim_analysis_result(pending, NOW.isoformat(), STALE_BEFORE)
+    assert db.get_one("analysis_results", {"id": pending})["status"] == "processing"
+
+
+def test_only_expired_leases_are_reclaimed(rows):
+    _, (pending, live, stale) = rows
+    assert analysis_results.list_unfinished_analysis_ids(STALE_BEFORE) == [pending, stale]
+    assert not analysis_results.claim_analysis_result(live, NOW.isoformat(), STALE_BEFORE)
+    assert analysis_results.claim_analysis_result(stale, NOW.isoformat(), STALE_BEFORE)
+
+
+def test_derivatives_are_claimed_once(rows):
+    images, _ = rows
+    assert image_file.list_image_ids_without_derivatives(STALE_BEFORE) == images
+    assert image_file.claim_image_derivatives(images[0], NOW.isoformat(), STALE_BEFORE)
+    assert not image_file.claim_image_derivatives(images[0], NOW.isoformat(), STALE_BEFORE)
+    assert image_file.list_image_ids_without_derivatives(STALE_BEFORE) == images[1:]
@@ -0,0 +1,44 @@
+"""Migraciones con varios procesos arrancando a la vez (workers de uvicorn).
+
+    python -m pytest tests
+"""
+import multiprocessing as mp
+import sqlite3
+
+import pytest
+
+from app.migrations import MIGRATIONS, get_version, migrate
+
+PROCESSES = 4
+RUNS = 20
+
+
+def _migrate(path, barrier):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA busy_timeout=5000")
+    barrier.wait()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("run", range(RUNS))
+def test_concurrent_migrate_on_fresh_database(tmp_path, run):
+    path = str(tmp_path / "concurrent.db")
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(PROCESSES)
+    processes = [ctx.Process(target=_migrate, args=(path, barrier)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+    conn = sqlite3.connect(path)
+    try:
+        assert get_version(conn) == MIGRATIONS[-1].version
+        columns = [row[1] for row in conn.execute("PRAGMA table_xinfo(analysis_results)")]
+        assert len(columns) == len(set(columns))
+    finally:
+        conn.close()
@@ -0,0 +1,96 @@
+"""EXPLAIN QUERY PLAN de las consultas de listado, conteo y export.
+
+    python -m pytest tests
+
+Las consultas se arman con las mismas funciones que usa la API
+(database.build_list_query, build_count_query, build_export_query...) y
+fallan si alguna recorre la tabla completa, ordena en un B-tree temporal o
+no usa el índice esperado.
+"""
+import json
+import re
+
+import pytest
+
+from app import database as db
+from app.config import settings
+from app.repository import analysis_results
+
+FULL_SCAN = re.compile(r"^SCAN (users|image_files|analysis_results|analysis_daily_stats)$")
+TEMP_SORT = "USE TEMP B-TREE FOR ORDER BY"
+SINCE = "2025-01-10T00:00:00"
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path_factory.mktemp("plans") / "plans.db"))
+        db.ensure_db()
+        db.create_many("image_files", [{
+            "name": f"scan_{i}.jpg", "size": 1, "type": "image/jpeg", "last_modified": 0,
+            "url": f"uploads/{i}.jpg", "uploaded_at": f"2025-01-{i % 28 + 1:02d}T00:00:00",
+            "status": "uploaded" if i % 3 else "processing", "content_hash": f"{i:064x}",
+        } for i in range(500)])
+        db.create_many("analysis_results", [{
+            "image_id": i % 500 + 1, "pcos_probability": 0.5, "confidence": 0.8,
+            "analyzed_at": f"2025-01-{i % 28 + 1:02d}T00:00:00",
+            "status": "completed" if i % 4 else "pending",
+            "model_version": ("1.0" if i % 2 else "2.0") if i % 4 else None,
+            "findings": json.dumps({"diagnosis": "Infectado" if i % 3 else "No Infectado",
+                                    "requires_review": i % 5 == 0}),
+        } for i in range(1000)])
+        db.get_connection().execute("ANALYZE")
+        yield
+        db.close_connections()
+
+
+def _list_query(table, filters, order_by, order_dir, with_cursor=False):
+    cursor = db.encode_cursor(order_by, SINCE, 100) if with_cursor else None
+    return db.build_list_query(table, ["*"], filters, order_by, order_dir, 10, 1, cursor)
+
+
+# (consulta, índice esperado o None)
+CASES = [
+    pytest.param(lambda: _list_query("image_files", {"status": "uploaded"}, "uploaded_at", "DESC"), None,
+                 id="image_files by status, newest first"),
+    pytest.param(lambda: _list_query("image_files", {"status": "uploaded"}, "uploaded_at", "DESC", True), None,
+                 id="image_files by status, cursor page"),
+    pytest.param(lambda: _list_query("image_files", {"content_hash": "abc"}, "id", "ASC"), None,
+                 id="image_files by content_hash"),
+    pytest.param(lambda: _list_query("image_files", {"name": "scan"}, "id", "ASC"), None,
+                 id="image_files name search"),
+    pytest.param(lambda: _list_query("users", {"name": "garc"}, "id", "ASC"), None,
+                 id="users name search"),
+    pytest.param(lambda: _list_query("analysis_results", {"image_id": 1}, "id", "ASC"), None,
+                 id="analysis_results by image_id"),
+    pytest.param(lambda: _list_query("analysis_results", {"status": "completed"}, "analyzed_at", "ASC"), None,
+                 id="analysis_results by status, analyzed_at"),
+    pytest.param(lambda: _list_query("analysis_results", {"status": "pending"}, "analyzed_at", "ASC", True), None,
+                 id="analysis_results by status, cursor page"),
+    pytest.param(lambda: analysis_results.build_export_query(SINCE, 100), None,
+                 id="analysis_results export since watermark"),
+    pytest.param(lambda: db.build_count_query("analysis_results", "diagnosis", {"diagnosis": "Infectado"},
+                                              "analyzed_at", SINCE), None,
+                 id="analysis_results count one diagnosis since"),
+    pytest.param(lambda: db.build_count_query("analysis_results", "status", {"requires_review": 1},
+                                              "analyzed_at", SINCE), None,
+                 id="analysis_results count requires_review since"),
+    pytest.param(lambda: db.build_count_query("analysis_results", "diagnosis", {}, "analyzed_at",
+                                              "2025-01-25T00:00:00"), None,
+                 id="analysis_results counts by diagnosis since"),
+    pytest.param(lambda: db.build_count_query("analysis_results", "model_version", {"model_version": "1.0"},
+                                              "analyzed_at", SINCE),
+                 "idx_analysis_results_model_version_analyzed_at",
+                 id="analysis_results count one model_version since"),
+    pytest.param(lambda: analysis_results.build_stats_query(["day"], {"status": "completed"}, "2025-01-10"), None,
+                 id="analysis_daily_stats by day since"),
+]
+
+
+@pytest.mark.parametrize("build, index", CASES)
+def test_query_uses_index(seeded, build, index):
+    query, params = build()
+    plan = db.explain_query_plan(query, params)
+    assert not [line for line in plan if FULL_SCAN.match(line) or TEMP_SORT in line], plan
+    if index is not None:
+        assert any(index in line for line in plan), plan